@@ -1,6 +1,5 @@
 import argparse
 import pathlib
-import astropy.convolution
 import shutil
 import numpy as np
 import xarray as xr
@@ -10,14 +9,32 @@ import fargo_data_process.utils
 
 
 def generate_beam_noise(size, noise_level, beam_size, seed=0):
+    """
+
+    Args:
+        size: number of pixels along x and y.
+        noise_level: standard deviation of each noise map.
+        beam_size: standard deviation of the beam in pixel, a scalar or one per map.
+        seed: seed or ``np.random.SeedSequence``, or a list of them with one per map,
+            e.g. ``utils.run_seed_sequences``. A single seed gives the same white noise to every map.
+
+    Returns:
+        noise: shape (size, size), or (len(beam_size), size, size) for the beam sizes of all runs,
+            all maps convolved with their beam in one FFT pass.
+    """
+    beam_size = np.asarray(beam_size, dtype=float)
     # Generate white noise
-    rng = np.random.default_rng(seed)
-    noise = rng.standard_normal((size, size))
-    # generate kernel
-    kernel = astropy.convolution.Gaussian2DKernel(beam_size)
+    if isinstance(seed, (list, tuple)):
+        noise = np.stack(
+            [np.random.default_rng(s).standard_normal((size, size)) for s in seed]
+        ).reshape(beam_size.shape + (size, size))
+    else:
+        rng = np.random.default_rng(seed)
+        noise = rng.standard_normal((size, size))
+        noise = np.broadcast_to(noise, beam_size.shape + noise.shape)
     # convolve the beam with the white noise
-    noise = astropy.convolution.convolve(noise, kernel)
-    noise = noise / np.std(noise) * noise_level
+    noise = fargo_data_process.utils.convolve_gaussian_beam(noise, beam_size)
+    noise = noise / np.std(noise, axis=(-2, -1), keepdims=True) * noise_level
     return noise
 
 
@@ -37,6 +54,18 @@ def main():
     parser.add_argument("--noise", type=float, help="in dex")
     parser.add_argument("--beam_size", type=float, default=2.5, help="in 100 AU")
     parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--operator_cache_dir",
+        type=str,
+        help="Directory where the polar/cartesian interpolation operators are saved and reused.",
+    )
+    parser.add_argument(
+        "--remap",
+        type=str,
+        choices=["linear", "conservative"],
+        default="linear",
+        help="Polar/cartesian regridding, point interpolation or area-weighted (conservative).",
+    )
     args = parser.parse_args()
 
     data_dir = fargo_data_process.utils.match_run_dir(
@@ -60,16 +89,19 @@ def main():
     # below is scale in pixel
     size = 512
     scale = scale / 5 * size
-    noise_list = []
-    for scale_ in scale.values:
-        filtered_noise = generate_beam_noise(size, args.noise, scale_, args.seed)
-        noise_list.append(filtered_noise)
-    # stack noise
-    filtered_noise = np.stack(noise_list)
+    # noise of all runs at once, one random stream per run
+    filtered_noise = generate_beam_noise(
+        size,
+        args.noise,
+        scale.values,
+        fargo_data_process.utils.run_seed_sequences(args.seed, data["run"].values),
+    )
 
     # convert to cartesian
     x = y = np.linspace(-2.5, 2.5, size)
-    data_in_cartesian = fargo_data_process.utils.xarray_polar_to_cartesian(data, x, y)
+    data_in_cartesian = fargo_data_process.utils.xarray_polar_to_cartesian(
+        data, x, y, cache_dir=args.operator_cache_dir, method=args.remap
+    )
     # filtered noise to xarray
     filtered_noise = xr.DataArray(filtered_noise, coords=data_in_cartesian.coords)
     # add noise
@@ -78,7 +110,11 @@ def main():
     data_in_cartesian = data_in_cartesian * 10 ** (filtered_noise * data_variance)
     # convert back to polar
     data = fargo_data_process.utils.xarray_cartesian_to_polar(
-        data_in_cartesian, data.r.values, data.theta.values
+        data_in_cartesian,
+        data.r.values,
+        data.theta.values,
+        cache_dir=args.operator_cache_dir,
+        method=args.remap,
     )
 
     data.to_netcdf(save_dir / file)
@@ -36,8 +36,19 @@ def main():
         if (save_dir / file).exists():
             raise FileExistsError(f"{save_dir / file} exists.")
         data = xr.open_dataarray(data_dir / file)
-        rng = np.random.default_rng(seed=args.seed)
-        data = data * 10 ** rng.normal(0, args.noise, data.shape)
+        # one random stream per run, independent of the order of the runs
+        dims = ("run",) + tuple(dim for dim in data.dims if dim != "run")
+        noise = np.stack(
+            [
+                np.random.default_rng(seed).normal(
+                    0, args.noise, data.transpose(*dims).shape[1:]
+                )
+                for seed in fargo_data_process.utils.run_seed_sequences(
+                    args.seed, data["run"].values
+                )
+            ]
+        )
+        data = data * 10 ** xr.DataArray(noise, dims=dims)
         data.to_netcdf(save_dir / file)
 
 
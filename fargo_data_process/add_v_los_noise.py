@@ -1,9 +1,10 @@
 import argparse
 import functools
+import os
 import pathlib
 import shutil
+import tempfile
 
-import astropy.convolution
 import joblib
 import numpy as np
 import tqdm
@@ -13,6 +14,43 @@ from scipy.optimize import curve_fit
 import fargo_data_process.utils
 
 
+def iter_cube_noise_chunks(
+    beam_size_pixel: float,
+    n_channels: int,
+    size: int,
+    cube_noise_level: float,
+    seed: int = 0,
+    chunk_channels: int = 16,
+):
+    """the noise cube of ``compute_cube_noise_map``, generated ``chunk_channels`` channels at a time
+
+    Args:
+        beam_size_pixel:
+        n_channels:
+        size:
+        cube_noise_level:
+        seed:
+        chunk_channels: number of channels generated together.
+
+    Yields:
+        start: index of the first channel of the chunk.
+        noise_convolved: shape (chunk_channels, size, size), fewer channels for the last chunk.
+    """
+    rng = np.random.default_rng(seed)
+    for start in range(0, n_channels, chunk_channels):
+        # the same draws as one (size, size) white noise map per channel
+        noise_map = rng.standard_normal(
+            (min(chunk_channels, n_channels - start), size, size)
+        )
+        # spatially convolve the beam with the white noise of the channels
+        noise_convolved = fargo_data_process.utils.convolve_gaussian_beam(
+            noise_map, beam_size_pixel
+        )
+        noise_convolved /= np.std(noise_convolved, axis=(1, 2), keepdims=True)
+        noise_convolved *= cube_noise_level
+        yield start, noise_convolved
+
+
 def compute_cube_noise_map(
     beam_size_pixel: float,
     n_channels: int,
@@ -32,20 +70,11 @@ def compute_cube_noise_map(
     Returns:
         noise_convolved: shape (n_channels, size, size)
     """
-    rng = np.random.default_rng(seed)
-
-    # generate kernel
-    kernel = astropy.convolution.Gaussian2DKernel(beam_size_pixel)
-
-    # for each channel, spatially convolve the beam with the white noise
     noise_convolved = np.empty((n_channels, size, size))
-    for i in range(n_channels):
-        noise_map = rng.standard_normal((size, size))
-        convolved_noise_map = astropy.convolution.convolve(noise_map, kernel)
-        convolved_noise_map = (
-            convolved_noise_map / np.std(convolved_noise_map) * cube_noise_level
-        )
-        noise_convolved[i] = convolved_noise_map
+    for start, noise in iter_cube_noise_chunks(
+        beam_size_pixel, n_channels, size, cube_noise_level, seed
+    ):
+        noise_convolved[start : start + len(noise)] = noise
 
     return noise_convolved
 
@@ -98,6 +127,222 @@ def fit_noisy_velocity_center(
     return popt[1]
 
 
+def fit_noisy_velocity_centers(
+    velocities: np.array,
+    noise: np.array,
+    vgrid: np.array,
+    line_width: float,
+    max_iter: int = 200,
+    xtol: float = 1.5e-8,
+    ftol: float = 1.5e-8,
+    chunk_size: int = 4096,
+) -> np.array:
+    """Batched ``fit_noisy_velocity_center``, the lines of all pixels are fitted together.
+
+    Levenberg-Marquardt iterations as curve_fit, with the 3x3 normal equations of every pixel solved at once.
+    Pixels are processed in chunks of ``chunk_size`` to bound the memory of the (pixels, channels, 3) jacobian.
+
+    Args:
+        velocities: (n_pixels,) line-of-sight velocity of each pixel, NaN pixels give NaN.
+        noise: (n_pixels, n_channels) noise added to the line of each pixel.
+        vgrid: (n_channels,) velocity of the channels.
+        line_width: standard deviation of the line.
+        max_iter: pixels not converged after ``max_iter`` iterations give NaN, as a failed curve_fit.
+        xtol: relative change of the parameters below which a pixel has converged.
+        ftol: relative reduction of the sum of squares below which a pixel has converged.
+        chunk_size: number of pixels fitted together.
+
+    Returns:
+        centers: (n_pixels,) location of the peak of the fitted Gaussian.
+    """
+    velocities = np.asarray(velocities, dtype=float)
+    centers = np.full(velocities.shape, np.nan)
+    valid = np.flatnonzero(~np.isnan(velocities))
+    for start in range(0, len(valid), chunk_size):
+        index = valid[start : start + chunk_size]
+        v = velocities[index]
+        line = np.exp(-0.5 * ((v[:, None] - vgrid) / line_width) ** 2) + noise[index]
+        # the parameters a, b, c are magnitude, location of the peak and standard deviation
+        params = np.stack([np.ones_like(v), v, np.full_like(v, line_width)], axis=1)
+        centers[index] = _levenberg_marquardt(params, line, vgrid, max_iter, xtol, ftol)
+    n_failed = np.count_nonzero(np.isnan(centers[valid]))
+    if n_failed > 0:
+        print(f"fitting failed for {n_failed} pixels")
+    return centers
+
+
+def _levenberg_marquardt(params, line, vgrid, max_iter, xtol, ftol):
+    """fit ``gaussian`` to every row of line, return the location of the peak, NaN if not converged"""
+    result = np.full(len(params), np.nan)
+    # pixels still iterating, with their residuals, sum of squares and damping
+    active = np.arange(len(params))
+    r = gaussian(vgrid, params[:, 0:1], params[:, 1:2], params[:, 2:3]) - line
+    cost = np.sum(r**2, axis=1)
+    damping = None
+    for _ in range(max_iter):
+        if len(active) == 0:
+            break
+        p = params[active]
+        # (pixels, channels, 3)
+        jac = jacobian(vgrid, p[:, 0:1], p[:, 1:2], p[:, 2:3])
+        jtj = np.einsum("pci,pcj->pij", jac, jac)
+        jtr = np.einsum("pci,pc->pi", jac, r)
+        diag = np.diagonal(jtj, axis1=1, axis2=2)
+        if damping is None:
+            damping = 1e-3 * np.max(diag, axis=1)
+        # Marquardt scaling by the diagonal
+        lhs = jtj + (damping[:, None] * np.maximum(diag, 1e-12))[..., None] * np.eye(3)
+        with np.errstate(all="ignore"):
+            step = -np.linalg.solve(lhs, jtr[..., None])[..., 0]
+            p_new = p + step
+            r_new = (
+                gaussian(vgrid, p_new[:, 0:1], p_new[:, 1:2], p_new[:, 2:3])
+                - line[active]
+            )
+            cost_new = np.sum(r_new**2, axis=1)
+        accept = cost_new < cost
+        small_step = np.all(np.abs(step) <= xtol * (np.abs(p) + xtol), axis=1)
+        # a rejected small step means that the minimum is reached
+        converged = small_step | (accept & (cost - cost_new <= ftol * cost))
+        params[active[accept]] = p_new[accept]
+        r[accept] = r_new[accept]
+        cost[accept] = cost_new[accept]
+        damping = np.where(accept, damping / 10, damping * 10)
+
+        failed = ~np.all(np.isfinite(params[active]), axis=1)
+        done = converged & ~failed
+        result[active[done]] = params[active[done], 1]
+        keep = ~converged & ~failed
+        active, r, cost, damping = active[keep], r[keep], cost[keep], damping[keep]
+    return result
+
+
+def streaming_noisy_velocity_map(
+    velocity_map: np.array,
+    beam_size: float,
+    vgrid: np.array,
+    line_width: float,
+    cube_noise_level: float,
+    seed: int = 0,
+    memory_budget: float = 1e9,
+    n_jobs: int = 1,
+    tmp_dir: str = None,
+) -> np.array:
+    """``noisy_velocity_map`` with the memory bounded by ``memory_budget``, the noise cube is never held in memory.
+
+    The noise is generated a few channels at a time and appended to a (n_channels, n_pixels) ``.npy`` file,
+    then the pixels are fitted in tiles. Each worker memory-maps that file for its tile,
+    so the noise reaches the workers through the shared page cache instead of being pickled.
+
+    Args:
+        velocity_map: (size, size) line-of-sight velocity in cartesian coordinates.
+        beam_size: in pixel.
+        vgrid: (n_channels,) velocity of the channels.
+        line_width: standard deviation of the line.
+        cube_noise_level:
+        seed:
+        memory_budget: in bytes, shared by the noise generation and the ``n_jobs`` workers of the fit.
+        n_jobs: number of processes fitting the pixel tiles.
+        tmp_dir: directory of the noise file, the system default if None.
+
+    Returns:
+        noisy_map: (size, size), the same as ``noisy_velocity_map``.
+    """
+    size, n_channels = velocity_map.shape[-1], len(vgrid)
+    n_pixels = velocity_map.size
+    # white noise, convolved noise, the padded spectra and the temporaries of one channel
+    chunk_channels = int(max(1, min(n_channels, memory_budget // (8 * size**2 * 8))))
+    # line, residuals and (pixels, channels, 3) jacobian of one pixel
+    tile_pixels = int(max(1, memory_budget // (n_jobs * 16 * n_channels * 8)))
+
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as tmp:
+        noise_file = os.path.join(tmp, "cube_noise.npy")
+        with open(noise_file, "wb") as f:
+            np.lib.format.write_array_header_1_0(
+                f,
+                {
+                    "descr": np.dtype(float).str,
+                    "fortran_order": False,
+                    "shape": (n_channels, n_pixels),
+                },
+            )
+            # channel-major, each chunk is appended as it is generated
+            for _, chunk in iter_cube_noise_chunks(
+                beam_size, n_channels, size, cube_noise_level, seed, chunk_channels
+            ):
+                f.write(chunk.tobytes())
+
+        data_flattened = velocity_map.flatten()
+        noisy_data = joblib.Parallel(n_jobs=n_jobs)(
+            joblib.delayed(_fit_noise_tile)(
+                data_flattened[start : start + tile_pixels],
+                noise_file,
+                start,
+                vgrid,
+                line_width,
+            )
+            for start in range(0, n_pixels, tile_pixels)
+        )
+    return np.concatenate(noisy_data).reshape(velocity_map.shape)
+
+
+def _fit_noise_tile(velocities, noise_file, start, vgrid, line_width):
+    """fit the pixels start:start + len(velocities) with the noise of the (n_channels, n_pixels) noise file"""
+    # the mapping only lives for one tile, the pages stay in the shared page cache
+    noise = np.load(noise_file, mmap_mode="r")
+    noise = np.ascontiguousarray(noise[:, start : start + len(velocities)].T)
+    return fit_noisy_velocity_centers(
+        velocities, noise, vgrid, line_width, chunk_size=len(velocities)
+    )
+
+
+def noisy_velocity_map(
+    velocity_map: np.array,
+    beam_size: float,
+    vgrid: np.array,
+    line_width: float,
+    cube_noise_level: float,
+    seed: int = 0,
+    fitter: str = "batched",
+) -> np.array:
+    """Noisy line-of-sight velocity of one run, the line centers fitted to the noisy cube.
+
+    Args:
+        velocity_map: (size, size) line-of-sight velocity in cartesian coordinates.
+        beam_size: in pixel.
+        vgrid: (n_channels,) velocity of the channels.
+        line_width: standard deviation of the line.
+        cube_noise_level:
+        seed:
+        fitter: "batched" fits all pixels at once, "curve_fit" fits pixel by pixel.
+
+    Returns:
+        noisy_map: (size, size)
+    """
+    cube_noise_map = compute_cube_noise_map(
+        beam_size, len(vgrid), velocity_map.shape[-1], cube_noise_level, seed
+    )
+    data_flattened = velocity_map.flatten()
+    cube_noise_map = cube_noise_map.reshape(cube_noise_map.shape[0], -1)
+
+    if fitter == "batched":
+        noisy_data = fit_noisy_velocity_centers(
+            data_flattened, cube_noise_map.T, vgrid, line_width
+        )
+    elif fitter == "curve_fit":
+        # Create a partial function with vgrid and line_width fixed
+        partial_fit_noisy_velocity_center = functools.partial(
+            fit_noisy_velocity_center, vgrid=vgrid, line_width=line_width
+        )
+        noisy_data = joblib.Parallel(n_jobs=-1)(
+            joblib.delayed(partial_fit_noisy_velocity_center)(v, noise)
+            for v, noise in zip(data_flattened, cube_noise_map.T)
+        )
+    else:
+        raise ValueError(f"Unknown fitter {fitter}")
+    return np.array(noisy_data).reshape(velocity_map.shape)
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--data_root_dir", type=str)
@@ -113,7 +358,42 @@ def main():
     parser.add_argument("--n_channels", type=int, default=200)
     parser.add_argument("--cube_noise_level", type=float, default=0.1)
     parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--operator_cache_dir",
+        type=str,
+        help="Directory where the polar/cartesian interpolation operators are saved and reused.",
+    )
+    parser.add_argument(
+        "--remap",
+        type=str,
+        choices=["linear", "conservative"],
+        default="linear",
+        help="Polar/cartesian regridding, point interpolation or area-weighted (conservative).",
+    )
+    parser.add_argument(
+        "--fitter",
+        type=str,
+        choices=["batched", "curve_fit"],
+        default="batched",
+        help="Fit the line centers of all pixels at once, or pixel by pixel with curve_fit.",
+    )
+    parser.add_argument(
+        "--n_jobs",
+        type=int,
+        default=1,
+        help="Number of processes over the runs, or over the pixel tiles with --memory_budget.",
+    )
+    parser.add_argument(
+        "--memory_budget",
+        type=float,
+        help="in MB, stream the noise cube through a memory-mapped file and fit the pixels in tiles.",
+    )
+    parser.add_argument(
+        "--tmp_dir", type=str, help="Directory of the memory-mapped noise cube."
+    )
     args = parser.parse_args()
+    if args.memory_budget is not None and args.fitter != "batched":
+        parser.error("--memory_budget requires --fitter batched")
 
     data_dir = fargo_data_process.utils.match_run_dir(
         args.data_root_dir, args.dataset_id
@@ -134,43 +414,52 @@ def main():
     data = xr.open_dataarray(data_dir / "batch_truth_v_los.nc")
     # to cartesian
     x = y = np.linspace(-2.5, 2.5, args.cartesian_resolution)
-    data_cart = fargo_data_process.utils.xarray_polar_to_cartesian(data, x, y)
+    data_cart = fargo_data_process.utils.xarray_polar_to_cartesian(
+        data, x, y, cache_dir=args.operator_cache_dir, method=args.remap
+    )
 
     data_cart_array = data_cart.values
     vgrid = np.linspace(args.vmin, args.vmax, args.n_channels)
-    line_width = args.line_width
-    noisy_data_cart = np.empty(data_cart_array.shape) * np.nan
-    # Create a partial function with vgrid and line_width fixed
-    partial_fit_noisy_velocity_center = functools.partial(
-        fit_noisy_velocity_center, vgrid=vgrid, line_width=line_width
+    # beam size below is in coordinate
+    beam_sizes = args.beam_size_physical / data_cart["r_p"].values
+    # beam size below is in pixel
+    beam_sizes = beam_sizes / 5 * args.cartesian_resolution
+    # one random stream per run, the same whatever process fits the run
+    seeds = fargo_data_process.utils.run_seed_sequences(
+        args.seed, data_cart["run"].values
     )
 
-    # nested tqdm progress bar loop
-    for run_index in tqdm.tqdm(range(data_cart_array.shape[0]), desc="run", ncols=80):
-        # beam size below is in coordinate
-        beam_size = (
-            args.beam_size_physical / data_cart.isel(run=run_index)["r_p"].values
-        )
-        # beam size below is in pixel
-        beam_size = beam_size / 5 * args.cartesian_resolution
-        # cube noise map
-        cube_noise_map = compute_cube_noise_map(
-            beam_size,
-            args.n_channels,
-            args.cartesian_resolution,
-            args.cube_noise_level,
-            args.seed,
-        )
-        data_flattened = data_cart_array[run_index].flatten()
-        cube_noise_map = cube_noise_map.reshape(cube_noise_map.shape[0], -1)
-
-        noisy_data = joblib.Parallel(n_jobs=-1)(
-            joblib.delayed(partial_fit_noisy_velocity_center)(v, noise)
-            for v, noise in zip(data_flattened, cube_noise_map.T)
+    run_indices = tqdm.tqdm(range(data_cart_array.shape[0]), desc="run", ncols=80)
+    if args.memory_budget is None:
+        noisy_data_cart = joblib.Parallel(n_jobs=args.n_jobs)(
+            joblib.delayed(noisy_velocity_map)(
+                data_cart_array[run_index],
+                beam_sizes[run_index],
+                vgrid,
+                args.line_width,
+                args.cube_noise_level,
+                seeds[run_index],
+                args.fitter,
+            )
+            for run_index in run_indices
         )
-
-        noisy_data = np.array(noisy_data).reshape(data_cart_array.shape[1:])
-        noisy_data_cart[run_index] = noisy_data
+    else:
+        # one run at a time, the budget is shared by the workers of its pixel tiles
+        noisy_data_cart = [
+            streaming_noisy_velocity_map(
+                data_cart_array[run_index],
+                beam_sizes[run_index],
+                vgrid,
+                args.line_width,
+                args.cube_noise_level,
+                seeds[run_index],
+                memory_budget=args.memory_budget * 1e6,
+                n_jobs=args.n_jobs,
+                tmp_dir=args.tmp_dir,
+            )
+            for run_index in run_indices
+        ]
+    noisy_data_cart = np.stack(noisy_data_cart)
 
     noisy_data_cart = xr.DataArray(
         noisy_data_cart,
@@ -179,7 +468,11 @@ def main():
     )
     # convert back to polar
     noisy_data = fargo_data_process.utils.xarray_cartesian_to_polar(
-        noisy_data_cart, data.r.values, data.theta.values
+        noisy_data_cart,
+        data.r.values,
+        data.theta.values,
+        cache_dir=args.operator_cache_dir,
+        method=args.remap,
     )
     noisy_data.to_netcdf(save_dir / "batch_truth_v_los.nc")
 
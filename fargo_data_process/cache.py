@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+CACHE_DIR_NAME = ".fargo_cache"
+DEFAULT_MAX_BYTES = 20 * 2**30
+
+
+def file_sha1(file_path: str) -> str:
+    with open(file_path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+class FrameCache(object):
+    """On-disk cache of stacked FARGO3D outputs, one ``.npy`` file (NT, NY, NX) per field and frame selection.
+
+    An entry is valid as long as the size and mtime of every output file and the content of
+    ``variables.par`` are unchanged. The least recently used entries are evicted once the cache
+    grows beyond ``max_bytes``.
+    """
+
+    def __init__(
+        self, output_dir: str, max_bytes: int = DEFAULT_MAX_BYTES, cache_dir: str = None
+    ):
+        """
+
+        :param output_dir: the directory path of the FARGO3D outputs, which contains ``variables.par``
+        :param max_bytes: size limit of the cache directory
+        :param cache_dir: directory of the cache, ``output_dir/.fargo_cache`` if None
+        """
+        self.output_dir = output_dir
+        self.max_bytes = max_bytes
+        self.cache_dir = (
+            os.path.join(output_dir, CACHE_DIR_NAME) if cache_dir is None else cache_dir
+        )
+
+    @staticmethod
+    def key(file_list, dtype) -> str:
+        """name of the entry, from the file names and the dtype of the stacked array"""
+        content = json.dumps(
+            [[os.path.basename(file) for file in file_list], np.dtype(dtype).str]
+        )
+        return hashlib.sha1(content.encode()).hexdigest()
+
+    def signature(self, file_list) -> dict:
+        """what an entry is validated against"""
+        return {
+            "variables.par": file_sha1(os.path.join(self.output_dir, "variables.par")),
+            "files": [
+                [os.path.basename(file), stat.st_size, stat.st_mtime_ns]
+                for file, stat in ((file, os.stat(file)) for file in file_list)
+            ],
+        }
+
+    def _paths(self, file_list, dtype):
+        key = self.key(file_list, dtype)
+        return (
+            os.path.join(self.cache_dir, key + ".npy"),
+            os.path.join(self.cache_dir, key + ".json"),
+        )
+
+    def _tmp_file(self, target, mode):
+        # unique name, processes storing the same entry do not collide
+        return tempfile.NamedTemporaryFile(
+            mode,
+            dir=self.cache_dir,
+            prefix=os.path.basename(target) + ".",
+            suffix=".tmp",
+            delete=False,
+        )
+
+    def load(self, file_list, dtype, mmap_mode="r"):
+        """
+
+        :param file_list: file paths of FARGO3D outputs data, the frames of the entry
+        :param dtype: dtype of the stacked array
+        :param mmap_mode: passed to ``np.load``
+        :return: (NT, NY, NX) array, or None if there is no valid entry
+        """
+        data_file, meta_file = self._paths(file_list, dtype)
+        try:
+            with open(meta_file, "r") as f:
+                signature = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if signature != self.signature(file_list):
+            return None
+        try:
+            # mark the entry as recently used
+            os.utime(data_file)
+        except FileNotFoundError:
+            return None
+        except OSError:
+            # read-only cache directory, the entry is still valid
+            pass
+        try:
+            return np.load(data_file, mmap_mode=mmap_mode)
+        except (OSError, ValueError):
+            # evicted or replaced by another process in the meantime
+            return None
+
+    def store(self, file_list, values: np.ndarray):
+        """write one entry, then evict the least recently used entries above ``max_bytes``
+
+        nothing is cached if the cache directory is not writable, e.g. a read-only output directory.
+
+        :param file_list: file paths of FARGO3D outputs data, the frames of the entry
+        :param values: (NT, NY, NX) array
+        """
+        if values.nbytes > self.max_bytes:
+            return
+        data_file, meta_file = self._paths(file_list, values.dtype)
+        tmp_files = []
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # write to temporary files first, readers never see a partial entry
+            with self._tmp_file(data_file, "wb") as f:
+                tmp_files.append(f.name)
+                np.save(f, values)
+            with self._tmp_file(meta_file, "w") as f:
+                tmp_files.append(f.name)
+                json.dump(self.signature(file_list), f)
+            os.replace(tmp_files[0], data_file)
+            os.replace(tmp_files[1], meta_file)
+            self.evict(keep=data_file)
+        except OSError:
+            for tmp_file in tmp_files:
+                if os.path.exists(tmp_file):
+                    os.remove(tmp_file)
+
+    def evict(self, keep: str = None):
+        """remove the least recently used entries until the cache fits in ``max_bytes``
+
+        :param keep: data file that is never removed, e.g. the entry just written
+        """
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".npy"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    # evicted by another process
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, data_file in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if data_file == keep:
+                continue
+            meta_file = data_file[: -len(".npy")] + ".json"
+            for file in [data_file, meta_file]:
+                try:
+                    os.remove(file)
+                except FileNotFoundError:
+                    pass
+            total -= size
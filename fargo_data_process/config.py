@@ -1,8 +1,71 @@
 import argparse
 
+from .cache import FrameCache
+from .fargoData import OutputDir
 
-def get_config(args=None):
+
+def get_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser("main")
     parser.add_argument("--output_dir", type=str, default="fargo3d/outputs")
+    parser.add_argument(
+        "--max_workers",
+        type=int,
+        default=1,
+        help="Number of threads reading output files concurrently.",
+    )
+    parser.add_argument("--t_min", type=float, help="Skip frames before t_min.")
+    parser.add_argument("--t_max", type=float, help="Skip frames after t_max.")
+    parser.add_argument("--stride", type=int, default=1, help="Read every n-th frame.")
+    parser.add_argument(
+        "--frame_indices",
+        type=int,
+        nargs="+",
+        help="Frame numbers to read, negative values count from the last frame, "
+        "e.g. -1 reads the last frame only.",
+    )
+    parser.add_argument(
+        "--dtype",
+        type=str,
+        choices=["float32", "float64"],
+        help="Precision of the converted data, the precision of the run if not set.",
+    )
+    parser.add_argument(
+        "--cache",
+        type=int,
+        choices=[0, 1],
+        default=0,
+        help="Keep the stacked frames in output_dir/.fargo_cache for later runs.",
+    )
+
+    return parser
+
+
+def get_config(args=None):
+    return get_parser().parse_args(args)
+
+
+def make_output_dir(
+    output_dir,
+    max_workers=1,
+    t_min=None,
+    t_max=None,
+    stride=1,
+    frame_indices=None,
+    dtype=None,
+    cache=False,
+) -> OutputDir:
+    """the ``OutputDir`` of the options added by ``get_parser``, shared by all the converters
 
-    return parser.parse_args(args)
+    Setup, coordinates and file index are parsed once for all fields.
+    """
+    return OutputDir(
+        output_dir,
+        max_workers=max_workers,
+        verbose=True,
+        t_min=t_min,
+        t_max=t_max,
+        stride=stride,
+        frame_indices=frame_indices,
+        dtype=dtype,
+        cache=FrameCache(output_dir) if cache else None,
+    )
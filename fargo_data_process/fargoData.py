@@ -1,7 +1,10 @@
+import concurrent.futures
 import functools
+import json
 import os
 import re
-from glob import glob
+import time
+import zlib
 
 import matplotlib.animation as animation
 import matplotlib.figure
@@ -10,17 +13,109 @@ import numpy as np
 import skimage.transform
 import xarray as xr
 
+from .cache import FrameCache, file_sha1
+
+OUTPUT_FILE_PATTERN = re.compile(
+    r"^(?P<fluid>[a-z]+\d*?)(?P<quantity>dens|energy|vx|vy|vz)(?P<index>\d+)\.dat$"
+)
+INDEX_FILE = ".fargo_index.json"
+
 
 def get_frame_index(file_path: str) -> int:
     """Extract the index of frame from file name
 
     :param file_path: the file path of FARGO3D outputs data |
         e.g. job/2020-05-30_13-17-14/outputs/gasdens5.dat
-    :return: the number included in the file name |
-        e.g. 5
+    :return: the last number included in the file name |
+        e.g. 5, also for dust fluids such as dust1dens5.dat
     """
     file_name = os.path.basename(file_path)
-    return int(re.findall("\d+", file_name)[0])
+    return int(re.findall(r"\d+", file_name)[-1])
+
+
+def get_frame_time(file_path: str, setup: dict) -> float:
+    """Compute the simulation time of a frame from its file name, without reading the file
+
+        t = frame_index * NINTERM * DT
+
+    :param file_path: the file path of FARGO3D outputs data |
+        e.g. job/2020-05-30_13-17-14/outputs/gasdens5.dat
+    :param setup: FARGO3D setup parameter, see ``get_setup``
+    :return: time
+    """
+    return get_frame_index(file_path) * int(setup["NINTERM"]) * float(setup["DT"])
+
+
+def select_files(
+    file_list,
+    setup: dict,
+    t_min: float = None,
+    t_max: float = None,
+    stride: int = 1,
+    frame_indices=None,
+) -> list:
+    """Select output files by frame index, time window and stride, using the file names only
+
+    The selectors are applied in the order ``frame_indices``, ``t_min``, ``t_max``, ``stride``.
+
+    :param file_list: file paths of FARGO3D outputs data, sorted by frame index
+    :param setup: FARGO3D setup parameter, see ``get_setup``
+    :param t_min: keep frames with time >= t_min
+    :param t_max: keep frames with time <= t_max
+    :param stride: keep every ``stride``-th frame
+    :param frame_indices: keep frames whose frame index (the number in the file name) is listed,
+        negative values count from the end of ``file_list``, e.g. -1 keeps the last frame
+    :return: selected file paths
+    """
+    if stride < 1:
+        raise ValueError("stride must be a positive integer.")
+    if frame_indices is not None:
+        frame_indices = set(frame_indices)
+        n_files = len(file_list)
+        file_list = [
+            f
+            for i, f in enumerate(file_list)
+            if get_frame_index(f) in frame_indices or i - n_files in frame_indices
+        ]
+    if t_min is not None:
+        file_list = [f for f in file_list if get_frame_time(f, setup) >= t_min]
+    if t_max is not None:
+        file_list = [f for f in file_list if get_frame_time(f, setup) <= t_max]
+    return list(file_list[::stride])
+
+
+def get_file_dtype(file_path: str, ny: int, nx: int) -> np.dtype:
+    """Infer the precision of one output file from its size
+
+    :param file_path: the file path of FARGO3D outputs data
+    :param ny: number of cells along y (radial) axis
+    :param nx: number of cells along x (azimuthal) axis
+    :return: np.dtype("float64") or np.dtype("float32")
+    """
+    file_size = os.path.getsize(file_path)
+    for dtype in [np.dtype("float64"), np.dtype("float32")]:
+        if file_size == ny * nx * dtype.itemsize:
+            return dtype
+    raise ValueError(
+        f"{file_path} has {file_size} bytes, expect {ny * nx} float64 or float32 values"
+    )
+
+
+def get_realtype(setup: dict, file_path: str = None) -> np.dtype:
+    """Precision of the output files of a run (``FLOAT`` opt / ``--RealType``)
+
+    ``REALTYPE`` of ``variables.par`` is used if present, otherwise the precision is inferred
+    from the size of ``file_path``, and defaults to float64 without any file.
+
+    :param setup: FARGO3D setup parameter, see ``get_setup``
+    :param file_path: one output file of the run
+    :return: np.dtype("float64") or np.dtype("float32")
+    """
+    if "REALTYPE" in setup:
+        return np.dtype(setup["REALTYPE"])
+    if file_path is not None:
+        return get_file_dtype(file_path, int(setup["NY"]), int(setup["NX"]))
+    return np.dtype(float)
 
 
 def neighbor_average(array: np.ndarray) -> np.ndarray:
@@ -51,16 +146,122 @@ def get_setup(output_dir: str) -> dict:
     return setup
 
 
+def file_crc32(file_path: str, chunk_size: int = 2**24) -> int:
+    """CRC-32 of a file, read in chunks of ``chunk_size`` bytes"""
+    crc = 0
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def scan_outputs(
+    output_dir: str, setup: dict = None, persist: bool = True, checksum: bool = False
+) -> dict:
+    """classify every output file of a directory by fluid, quantity and frame index, from one ``os.scandir``
+
+    other files (``planet0.dat``, ``domain_x.dat``, monitor outputs...) are not indexed. the index is
+    persisted as a manifest in ``output_dir/.fargo_index.json``, the records of files whose size and
+    mtime are unchanged are reused from it.
+
+    :param output_dir: the directory path of the FARGO3D outputs
+    :param setup: FARGO3D setup parameter, read from ``output_dir`` if None
+    :param persist: if True, write the manifest when the index has changed
+    :param checksum: if True, the CRC-32 of every complete file is computed, it is recorded as ``crc32`` the
+        first time and kept as long as the size and mtime are unchanged, a file whose CRC-32 differs from the
+        recorded one is not complete, e.g. a file corrupted or rewritten with the same size and mtime
+    :return: {file name: record}, a record has the keys ``fluid``, ``quantity``, ``field``, ``frame_index``,
+        ``time``, ``size``, ``mtime_ns`` and ``complete``, the integrity flag, True if the file holds NY * NX values
+    """
+    setup = get_setup(output_dir) if setup is None else setup
+    manifest_file = os.path.join(output_dir, INDEX_FILE)
+    setup_sha1 = file_sha1(os.path.join(output_dir, "variables.par"))
+    try:
+        with open(manifest_file, "r") as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        manifest = {}
+    # the records depend on the setup, through the time and the integrity flag
+    saved = manifest.get("files", {}) if manifest.get("setup") == setup_sha1 else {}
+
+    records = {}
+    with os.scandir(output_dir) as entries:
+        for entry in entries:
+            match = OUTPUT_FILE_PATTERN.match(entry.name)
+            if match is None or not entry.is_file():
+                continue
+            stat = entry.stat()
+            record = saved.get(entry.name)
+            if (
+                record is None
+                or record["size"] != stat.st_size
+                or record["mtime_ns"] != stat.st_mtime_ns
+            ):
+                frame_index = int(match.group("index"))
+                record = {
+                    "fluid": match.group("fluid"),
+                    "quantity": match.group("quantity"),
+                    "field": match.group("fluid") + match.group("quantity"),
+                    "frame_index": frame_index,
+                    "time": frame_index * int(setup["NINTERM"]) * float(setup["DT"]),
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                }
+            # copy, so that the saved records are left as they are for the comparison below
+            records[entry.name] = dict(record)
+
+    n_values = int(setup["NY"]) * int(setup["NX"])
+    if "REALTYPE" in setup:
+        itemsize = np.dtype(setup["REALTYPE"]).itemsize
+    else:
+        # a file being written is smaller, the largest file has the full size
+        largest = max((record["size"] for record in records.values()), default=0)
+        itemsize = 4 if largest == n_values * 4 else 8
+    for file_name, record in records.items():
+        record["complete"] = record["size"] == n_values * itemsize
+        if checksum and record["complete"]:
+            crc = file_crc32(os.path.join(output_dir, file_name))
+            record["complete"] = record.setdefault("crc32", crc) == crc
+
+    if persist and records != saved:
+        try:
+            with open(manifest_file + ".tmp", "w") as f:
+                json.dump({"setup": setup_sha1, "files": records}, f)
+            os.replace(manifest_file + ".tmp", manifest_file)
+        except OSError:
+            # read-only output directory, the index is still returned
+            pass
+    return records
+
+
+def group_by_field(output_dir: str, records: dict) -> dict:
+    """file paths of each field, see ``scan_outputs``
+
+    :param output_dir: the directory path of the FARGO3D outputs
+    :param records: {file name: record}, from ``scan_outputs``
+    :return: {field: file paths sorted by frame index}, the fields are sorted by name
+    """
+    file_index = {}
+    for file_name, record in sorted(
+        records.items(), key=lambda item: item[1]["frame_index"]
+    ):
+        file_index.setdefault(record["field"], []).append(
+            os.path.join(output_dir, file_name)
+        )
+    return dict(sorted(file_index.items()))
+
+
 class Coor(object):
     """class that store the coordinate values of grid used by FARGO3D"""
 
-    def __init__(self, output_dir: str):
+    def __init__(self, output_dir: str, setup: dict = None):
         """
 
         :param output_dir: the directory path of the FARGO3D outputs
+        :param setup: already parsed ``variables.par``, read from output_dir if None
         """
         self._output_dir = output_dir
-        self._setup = get_setup(output_dir)
+        self._setup = get_setup(output_dir) if setup is None else setup
         self._NGHY = 3
         self._x_edge = self.get_x_edge()
         self._y_edge = self.get_y_edge()
@@ -218,16 +419,120 @@ class CartesianToPolar:
         return np.hstack([theta, r])
 
 
+class PolarToCartesianMap:
+    """precomputed ``skimage.transform.warp`` of a polar grid with ``CartesianToPolar``, bilinear (order=1)
+    and 0 (cval) outside of the grid
+
+    the source indices and interpolation weights of the (nxy, nxy) output pixels are computed once,
+    applying the map is a weighted sum of 4 gathers, for one frame or a whole (NT, NY, NX) stack.
+    """
+
+    def __init__(self, nxy, nr, ntheta, rmin, rmax, theta_min, theta_max):
+        """
+
+        :param nxy: number of pixels along x and y of the cartesian image
+        :param nr: number of cells along r (y) of the polar grid
+        :param ntheta: number of cells along theta (x) of the polar grid
+        :param rmin: see ``CartesianToPolar``
+        :param rmax: see ``CartesianToPolar``
+        :param theta_min: see ``CartesianToPolar``
+        :param theta_max: see ``CartesianToPolar``
+        """
+        self.nxy = nxy
+        self.nr = nr
+        self.ntheta = ntheta
+        cartesian_to_polar = CartesianToPolar(
+            nxy, nr, ntheta, rmin, rmax, theta_min, theta_max
+        )
+        # (row, column) of the polar image at every output pixel, the same as warp
+        row, col = skimage.transform.warp_coords(cartesian_to_polar, (nxy, nxy))
+        row, col = row.ravel(), col.ravel()
+        # warp pads the grid with zeros (ndimage "grid-constant"), a pixel within one cell of the grid
+        # is interpolated with the padding
+        inside = (row > -1) & (row < nr) & (col > -1) & (col < ntheta)
+        self.pixels = np.flatnonzero(inside)
+        row, col = row[inside], col[inside]
+        row0, col0 = np.floor(row).astype(np.intp), np.floor(col).astype(np.intp)
+        fr, fc = row - row0, col - col0
+        indices, weights = [], []
+        for i, wr in [(row0, 1 - fr), (row0 + 1, fr)]:
+            for j, wc in [(col0, 1 - fc), (col0 + 1, fc)]:
+                # the padding has a zero weight, its index is clipped into the grid
+                valid = (i >= 0) & (i < nr) & (j >= 0) & (j < ntheta)
+                indices.append(
+                    np.clip(i, 0, nr - 1) * ntheta + np.clip(j, 0, ntheta - 1)
+                )
+                weights.append(np.where(valid, wr * wc, 0.0))
+        # flat indices of the 4 neighbours and their bilinear weights, (4, n_pixels)
+        self.indices = np.stack(indices)
+        self.weights = np.stack(weights)
+
+    def __call__(self, values: np.ndarray, max_workers: int = 1) -> np.ndarray:
+        """
+
+        :param values: (NY, NX) or (NT, NY, NX)
+        :param max_workers: number of threads, each one maps a block of frames
+        :return: (nxy, nxy) or (NT, nxy, nxy), float64
+        """
+        single = values.ndim == 2
+        values = values.reshape((-1, self.nr * self.ntheta))
+        out = np.zeros((len(values), self.nxy * self.nxy))
+
+        def apply(block):
+            flat = values[block]
+            result = self.weights[0] * flat[:, self.indices[0]]
+            for weights, indices in zip(self.weights[1:], self.indices[1:]):
+                result += weights * flat[:, indices]
+            out[block, self.pixels] = result
+
+        blocks = [slice(i, i + 1) for i in range(len(values))]
+        if max_workers == 1:
+            for block in blocks:
+                apply(block)
+        else:
+            with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+                list(executor.map(apply, blocks))
+        out = out.reshape((-1, self.nxy, self.nxy))
+        return out[0] if single else out
+
+
+@functools.lru_cache(maxsize=8)
+def get_polar_to_cartesian_map(
+    nxy, nr, ntheta, rmin, rmax, theta_min, theta_max
+) -> PolarToCartesianMap:
+    """``PolarToCartesianMap`` shared by all frames on the same grid"""
+    return PolarToCartesianMap(nxy, nr, ntheta, rmin, rmax, theta_min, theta_max)
+
+
 class GridData(object):
     """FARGO3D output data from one file, such as ``gasdens5.dat``, at one time step, include only one physical
     variable.
 
     """
 
-    def __init__(self, file_path: str, ny: int, nx: int):
+    def __init__(
+        self, file_path: str, ny: int, nx: int, mmap: bool = False, dtype=None
+    ):
+        """
+
+        :param file_path: the file path of FARGO3D outputs data
+        :param ny: number of cells along y (radial) axis
+        :param nx: number of cells along x (azimuthal) axis
+        :param mmap: if True, memory-map the file read-only instead of reading it into memory
+        :param dtype: precision of the file, inferred from the file size if None
+        """
         self.file_path = file_path
         self.ny = ny
         self.nx = nx
+        self.mmap = mmap
+        self._dtype = dtype
+
+    @functools.cached_property
+    def dtype(self) -> np.dtype:
+        """precision of the file, float64 or float32 (FARGO3D built with ``FLOAT``)"""
+        if self._dtype is None:
+            return get_file_dtype(self.file_path, self.ny, self.nx)
+        return np.dtype(self._dtype)
 
     @property
     def phys_var_type(self) -> str:
@@ -264,9 +569,63 @@ class GridData(object):
         the position of each quantity is specified by the simulation,
         by default **dens** is centered, **vx** is on the interface of x axis between two cell (x staggering), **vy** staggering on y
 
+        when ``mmap`` is True a read-only ``np.memmap`` is returned, only the pages that are accessed are read from disk,
+        and the page cache is shared with other processes reading the same file.
+
         :return: (NY, NX, 1)
         """
-        return np.fromfile(self.file_path, dtype=float).reshape(self.ny, self.nx, 1)
+        if self.mmap:
+            return np.memmap(
+                self.file_path, dtype=self.dtype, mode="r", shape=(self.ny, self.nx, 1)
+            )
+        return np.fromfile(self.file_path, dtype=self.dtype).reshape(
+            self.ny, self.nx, 1
+        )
+
+    def read_into(self, out: np.ndarray) -> np.ndarray:
+        """read the file straight into a preallocated array, without the temporary array of ``value``
+
+        :param out: C-contiguous array of ``dtype`` with NY * NX elements, e.g. one time step of a (NT, NY, NX) buffer
+        :return: out
+        """
+        if out.size != self.ny * self.nx or not out.flags.c_contiguous:
+            raise ValueError(f"out must be C-contiguous with {self.ny * self.nx} items")
+        if out.dtype != self.dtype:
+            raise TypeError(f"out must have dtype {self.dtype}, got {out.dtype}")
+        with open(self.file_path, "rb") as f:
+            file_size = os.fstat(f.fileno()).st_size
+            if file_size != out.nbytes:
+                raise ValueError(
+                    f"{self.file_path} has {file_size} bytes, expect {out.nbytes}"
+                )
+            f.readinto(memoryview(out).cast("B"))
+        return out
+
+    def read_rows(self, start: int, stop: int, out: np.ndarray = None) -> np.ndarray:
+        """read only the radial rows ``start:stop`` of the file, by byte offset
+
+        the rows are contiguous on disk (x varies fastest), a single seek and read fetch them.
+
+        :param start: first row (y index)
+        :param stop: row after the last one
+        :param out: C-contiguous array of ``dtype`` with (stop - start) * NX elements, allocated if None
+        :return: (stop - start, NX)
+        """
+        if not 0 <= start <= stop <= self.ny:
+            raise IndexError(f"rows {start}:{stop} out of range for NY={self.ny}")
+        if out is None:
+            out = np.empty((stop - start, self.nx), dtype=self.dtype)
+        if out.size != (stop - start) * self.nx or not out.flags.c_contiguous:
+            raise ValueError(
+                f"out must be C-contiguous with {(stop - start) * self.nx} items"
+            )
+        if out.dtype != self.dtype:
+            raise TypeError(f"out must have dtype {self.dtype}, got {out.dtype}")
+        with open(self.file_path, "rb") as f:
+            f.seek(start * self.nx * self.dtype.itemsize)
+            if f.readinto(memoryview(out).cast("B")) != out.nbytes:
+                raise ValueError(f"{self.file_path} is shorter than {self.ny} rows")
+        return out.reshape((stop - start, self.nx))
 
     @property
     def mean_value_over_x(self) -> np.ndarray:
@@ -277,30 +636,127 @@ class GridData(object):
         return np.mean(self.value, axis=1).flatten()
 
 
+def read_frames(
+    file_list,
+    ny: int,
+    nx: int,
+    mmap: bool = False,
+    max_workers: int = 1,
+    verbose: bool = False,
+    file_dtype=None,
+    dtype=None,
+    rows: slice = None,
+) -> np.ndarray:
+    """read several FARGO3D output files of the same physical variable into one preallocated array
+
+    :param file_list: file paths of FARGO3D outputs data, e.g. [gasdens0.dat, gasdens1.dat]
+    :param ny: number of cells along y (radial) axis
+    :param nx: number of cells along x (azimuthal) axis
+    :param mmap: passed to ``GridData``
+    :param max_workers: number of threads reading files concurrently, 1 reads serially,
+        None uses the default of ``concurrent.futures.ThreadPoolExecutor``
+    :param verbose: print the throughput in frames/s and MB/s
+    :param file_dtype: precision of the files, inferred from the size of the first file if None
+    :param dtype: dtype of the returned array, ``file_dtype`` if None
+    :param rows: contiguous radial band, e.g. ``slice(0, 1)`` or ``slice(-1, None)``, only these rows are read
+        from each file, all rows if None
+    :return: (len(file_list), NY, NX), NY is the number of rows of the band if ``rows`` is given
+    """
+    if file_dtype is None and len(file_list) > 0:
+        file_dtype = get_file_dtype(file_list[0], ny, nx)
+    band = None if rows is None else range(ny)[rows]
+    if band is not None and band.step != 1:
+        raise ValueError(f"rows must be a contiguous slice, got {rows}")
+    values = np.empty(
+        (len(file_list), ny if band is None else len(band), nx),
+        dtype=file_dtype if dtype is None else dtype,
+    )
+
+    def read(i):
+        grid_data = GridData(file_list[i], ny, nx, mmap=mmap, dtype=file_dtype)
+        if band is not None:
+            if values.dtype != grid_data.dtype:
+                values[i] = grid_data.read_rows(band.start, band.stop)
+            else:
+                grid_data.read_rows(band.start, band.stop, out=values[i])
+        elif mmap or values.dtype != grid_data.dtype:
+            values[i] = grid_data.value[..., 0]
+        else:
+            # one copy per byte, from the file to the buffer
+            grid_data.read_into(values[i])
+
+    start = time.perf_counter()
+    if max_workers == 1:
+        for i in range(len(file_list)):
+            read(i)
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+            # consume the iterator to re-raise exceptions from the workers
+            list(executor.map(read, range(len(file_list))))
+    elapsed = time.perf_counter() - start
+
+    if verbose:
+        elapsed = max(elapsed, 1e-9)
+        print(
+            f"read {len(file_list)} frames in {elapsed:.2f} s, "
+            f"{len(file_list) / elapsed:.1f} frames/s, "
+            f"{values.nbytes / elapsed / 1e6:.1f} MB/s"
+        )
+    return values
+
+
+def azimuthal_stats(values: np.ndarray, stats=("mean",), percentiles=()) -> dict:
+    """reduce a block of frames along the azimuthal (x) axis, all frames at once
+
+    :param values: (NT, NY, NX)
+    :param stats: any of ['mean', 'median', 'min', 'max']
+    :param percentiles: percentiles in [0, 100], e.g. (10, 90)
+    :return: {name: (NT, NY)}, the names are the stats and ``p<q>`` for the percentiles, e.g. ``p90``
+    """
+    reducers = {"mean": np.mean, "median": np.median, "min": np.min, "max": np.max}
+    result = {}
+    for stat in stats:
+        if stat not in reducers:
+            raise KeyError(f"{stat}, expect {list(reducers)}")
+        result[stat] = reducers[stat](values, axis=2)
+    if len(percentiles) > 0:
+        for q, value in zip(percentiles, np.percentile(values, percentiles, axis=2)):
+            result[f"p{q:g}"] = value
+    return result
+
+
 class FrameData(GridData):
     """FARGO3D output data from one file, such as ``gasdens5.dat``, at one time step, include only one physical
     variable.
 
     """
 
-    def __init__(self, file_path: str, setup: dict, y, x):
+    def __init__(
+        self, file_path: str, setup: dict, y, x, mmap: bool = False, dtype=None
+    ):
         """
 
         :param file_path: the file path of FARGO3D outputs data
         :param setup: FARGO3D setup parameter which defined the simulation problem. |
             setup = get_setup(output_dir)
         :param grid: Array that contain the coordinate value of grid, shape (NY, NX, 2).
+        :param mmap: if True, memory-map the file read-only instead of reading it into memory
+        :param dtype: precision of the file, see ``get_realtype`` if None
         """
         self.setup = setup
         super(FrameData, self).__init__(
-            file_path=file_path, ny=int(setup["NY"]), nx=int(setup["NX"])
+            file_path=file_path,
+            ny=int(setup["NY"]),
+            nx=int(setup["NX"]),
+            mmap=mmap,
+            dtype=get_realtype(setup, file_path) if dtype is None else dtype,
         )
         self.y = y
         self.x = x
 
     @functools.cached_property
     def time(self) -> float:
-        return self.frame_index * int(self.setup["NINTERM"]) * float(self.setup["DT"])
+        return get_frame_time(self.file_path, self.setup)
 
     @functools.cached_property
     def orbit(self) -> float:
@@ -371,33 +827,74 @@ class FrameData(GridData):
         return np.amax(self.y)
 
     def to_cartesian(self, nxy):
-        cartesian_to_polar = CartesianToPolar(
+        polar_to_cartesian = get_polar_to_cartesian_map(
             nxy,
             nr=self.ny,
             ntheta=self.nx,
-            rmin=self.ymin,
-            rmax=self.ymax,
-            theta_min=self.xmin,
-            theta_max=self.xmax,
-        )
-        value = self.value.reshape(self.value.shape[:2])
-        return skimage.transform.warp(
-            value, cartesian_to_polar, output_shape=(nxy, nxy)
+            rmin=float(self.ymin),
+            rmax=float(self.ymax),
+            theta_min=float(self.xmin),
+            theta_max=float(self.xmax),
         )
+        return polar_to_cartesian(self.value.reshape(self.value.shape[:2]))
 
 
 class TimeSeqData(object):
-    def __init__(self, output_dir: str, phys_var_type: str):
+    def __init__(
+        self,
+        output_dir: str,
+        phys_var_type: str,
+        mmap: bool = False,
+        max_workers: int = 1,
+        verbose: bool = False,
+        t_min: float = None,
+        t_max: float = None,
+        stride: int = 1,
+        frame_indices=None,
+        dtype=None,
+        cache: FrameCache = None,
+        setup: dict = None,
+        coor: Coor = None,
+        file_list=None,
+    ):
         """
 
+        The selectors ``frame_indices``, ``t_min``, ``t_max`` and ``stride`` filter ``file_list``,
+        files that are not selected are never read, see ``select_files``.
+
         :param str output_dir: the directory path of the FARGO3D outputs
             e.g. /Users/kyika/project/pinn/disk2D/job/2021-01-20_23-40-18/outputs
         :param str phys_var_type: expect ['dens', 'vx', 'vy']
+        :param bool mmap: if True, frames are memory-mapped read-only instead of read into memory
+        :param int max_workers: number of threads reading frames concurrently, see ``read_frames``
+        :param bool verbose: print the reading throughput
+        :param float t_min: keep frames with time >= t_min
+        :param float t_max: keep frames with time <= t_max
+        :param int stride: keep every ``stride``-th frame
+        :param frame_indices: keep frames whose ``frame_index`` (the number in the file name) is listed,
+            negative values count from the last frame, see ``select_files``
+        :param dtype: dtype of the stacked arrays, e.g. float32 to halve the memory, the precision of the files if None
+        :param FrameCache cache: on-disk cache of the stacked frames, not used if None
+        :param dict setup: already parsed ``variables.par``, to share it between objects, see ``OutputDir``
+        :param Coor coor: already parsed coordinates, to share them between objects
+        :param file_list: output files of ``phys_var_type`` sorted by frame index, from ``scan_outputs`` if None
         """
+        if stride < 1:
+            raise ValueError("stride must be a positive integer.")
         self.output_dir = output_dir
         self.phys_var_type = phys_var_type
-        self.setup = get_setup(self.output_dir)
-        self.coor = Coor(self.output_dir)
+        self.mmap = mmap
+        self.max_workers = max_workers
+        self.verbose = verbose
+        self.t_min = t_min
+        self.t_max = t_max
+        self.stride = stride
+        self.frame_indices = frame_indices
+        self.dtype = dtype
+        self.cache = cache
+        self.setup = get_setup(self.output_dir) if setup is None else setup
+        self.coor = Coor(self.output_dir, self.setup) if coor is None else coor
+        self._file_list = file_list
 
     @functools.cached_property
     def x(self) -> np.array:
@@ -434,28 +931,214 @@ class TimeSeqData(object):
 
     @functools.cached_property
     def file_list(self):
-        return sorted(
-            glob(
-                os.path.join(self.output_dir, "*" + self.phys_var_type + "*[0-9].dat")
-            ),
-            key=get_frame_index,
+        if self._file_list is None:
+            # only the gas fluid, the dust fluids and monitor outputs are not picked up
+            file_list = group_by_field(
+                self.output_dir, scan_outputs(self.output_dir, self.setup)
+            ).get("gas" + self.phys_var_type, [])
+        else:
+            file_list = self._file_list
+        return select_files(
+            file_list,
+            self.setup,
+            t_min=self.t_min,
+            t_max=self.t_max,
+            stride=self.stride,
+            frame_indices=self.frame_indices,
         )
 
+    @functools.cached_property
+    def file_dtype(self) -> np.dtype:
+        """precision of the output files, see ``get_realtype``"""
+        return get_realtype(self.setup, self.file_list[0] if self.file_list else None)
+
     @functools.cached_property
     def frames(self):
-        return [FrameData(file, self.setup, self.y, self.x) for file in self.file_list]
+        frames = [
+            FrameData(
+                file, self.setup, self.y, self.x, mmap=self.mmap, dtype=self.file_dtype
+            )
+            for file in self.file_list
+        ]
+        if self.cache is not None:
+            # the values of the frames are memory-mapped views of a valid cached stack,
+            # a cache miss leaves every frame to read its own file on access
+            values = self.cache.load(
+                self.file_list,
+                self.file_dtype if self.dtype is None else np.dtype(self.dtype),
+            )
+            if values is not None:
+                for frame, value in zip(frames, values):
+                    frame.__dict__["value"] = value[..., None]
+        return frames
 
     @functools.cached_property
     def t(self):
-        return np.array([frame.time for frame in self.frames])
+        # from the file names, no frame is read
+        return np.array([get_frame_time(file, self.setup) for file in self.file_list])
 
     @functools.cached_property
     def xarray(self):
-        array = xr.concat([frame.xarray for frame in self.frames], "t")
+        value = self.read_values()
+        array = xr.DataArray(
+            value,
+            coords={"t": self.t, "r": self.y, "theta": self.x},
+            dims=["t", "r", "theta"],
+        )
         array.attrs = self.setup
         array.attrs["phys_var_type"] = self.phys_var_type
         return array
 
+    def read_values(self) -> np.ndarray:
+        """stack the frames of ``file_list``, from ``cache`` if it holds a valid entry
+
+        a cache miss reads the files and stores the stack in the cache.
+
+        :return: (NT, NY, NX)
+        """
+        dtype = self.file_dtype if self.dtype is None else np.dtype(self.dtype)
+        if self.cache is not None:
+            values = self.cache.load(self.file_list, dtype)
+            if values is not None:
+                return values
+        values = read_frames(
+            self.file_list,
+            int(self.setup["NY"]),
+            int(self.setup["NX"]),
+            mmap=self.mmap,
+            max_workers=self.max_workers,
+            verbose=self.verbose,
+            file_dtype=self.file_dtype,
+            dtype=dtype,
+        )
+        if self.cache is not None:
+            self.cache.store(self.file_list, values)
+        return values
+
+    def lazy_xarray(self, frames_per_chunk: int = 1) -> xr.DataArray:
+        """dask-backed counterpart of ``xarray``, no data is read until it is computed
+
+        each chunk along ``t`` maps onto ``frames_per_chunk`` consecutive ``.dat`` files, so ``.isel(t=-1)``,
+        reductions or ``to_netcdf`` stream through the files instead of loading the whole run.
+
+        :param frames_per_chunk: number of frames (files) in one dask chunk
+        :return: (NT, NY, NX)
+        """
+        try:
+            import dask
+            import dask.array as da
+        except ImportError as e:
+            raise ImportError("lazy_xarray requires dask, `pip install dask`") from e
+
+        if frames_per_chunk < 1:
+            raise ValueError("frames_per_chunk must be a positive integer.")
+
+        ny, nx = int(self.setup["NY"]), int(self.setup["NX"])
+        chunks = []
+        for i in range(0, len(self.file_list), frames_per_chunk):
+            file_list = self.file_list[i : i + frames_per_chunk]
+            chunk = dask.delayed(read_frames)(
+                file_list,
+                ny,
+                nx,
+                mmap=self.mmap,
+                file_dtype=self.file_dtype,
+                dtype=self.dtype,
+            )
+            chunks.append(
+                da.from_delayed(
+                    chunk,
+                    shape=(len(file_list), ny, nx),
+                    dtype=self.file_dtype if self.dtype is None else self.dtype,
+                )
+            )
+        array = xr.DataArray(
+            da.concatenate(chunks, axis=0),
+            coords={"t": self.t, "r": self.y, "theta": self.x},
+            dims=["t", "r", "theta"],
+        )
+        array.attrs = dict(self.setup)
+        array.attrs["phys_var_type"] = self.phys_var_type
+        return array
+
+    def iter_frames(self, batch_size: int = 1):
+        """iterate over the frames in blocks, at most ``batch_size`` frames are held in memory at once
+
+        if ``xarray`` has already been computed the blocks are views of it and no file is read.
+
+        :param batch_size: number of frames per block
+        :return: generator of (t, values), t has shape (batch_size,), values (batch_size, NY, NX),
+            the last block may be shorter
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be a positive integer.")
+        ny, nx = int(self.setup["NY"]), int(self.setup["NX"])
+        stacked = None
+        if "xarray" in self.__dict__:
+            stacked = self.xarray.values
+        elif self.cache is not None:
+            # memory-mapped, only the pages of the current block are read
+            stacked = self.cache.load(
+                self.file_list,
+                self.file_dtype if self.dtype is None else np.dtype(self.dtype),
+            )
+        for i in range(0, len(self.file_list), batch_size):
+            if stacked is not None:
+                values = stacked[i : i + batch_size]
+            else:
+                values = read_frames(
+                    self.file_list[i : i + batch_size],
+                    ny,
+                    nx,
+                    mmap=self.mmap,
+                    max_workers=self.max_workers,
+                    file_dtype=self.file_dtype,
+                    dtype=self.dtype,
+                )
+            yield self.t[i : i + batch_size], values
+
+    def min_max(self, batch_size: int = 1) -> tuple:
+        """minimum and maximum over all frames, computed with ``iter_frames``
+
+        :param batch_size: passed to ``iter_frames``
+        :return: (vmin, vmax)
+        """
+        vmin, vmax = np.inf, -np.inf
+        for _, values in self.iter_frames(batch_size):
+            vmin = min(vmin, np.min(values))
+            vmax = max(vmax, np.max(values))
+        return vmin, vmax
+
+    def mean_over_x(self, batch_size: int = 1) -> np.ndarray:
+        """mean value over azimuthal direction for every frame, computed with ``iter_frames``
+
+        :param batch_size: passed to ``iter_frames``
+        :return: (NT, NY)
+        """
+        return np.concatenate(
+            [np.mean(values, axis=2) for _, values in self.iter_frames(batch_size)]
+        )
+
+    def var_over_t(self, batch_size: int = 1) -> np.ndarray:
+        """variance over time at every cell, computed with ``iter_frames``
+
+        blocks are merged with the parallel algorithm of Chan et al., so the result does not
+        depend on ``batch_size`` beyond round-off.
+
+        :param batch_size: passed to ``iter_frames``
+        :return: (NY, NX)
+        """
+        n, mean, m2 = 0, 0.0, 0.0
+        for _, values in self.iter_frames(batch_size):
+            n_block = values.shape[0]
+            mean_block = np.mean(values, axis=0)
+            m2_block = np.sum((values - mean_block) ** 2, axis=0)
+            delta = mean_block - mean
+            m2 = m2 + m2_block + delta**2 * n * n_block / (n + n_block)
+            mean = mean + delta * n_block / (n + n_block)
+            n = n + n_block
+        return m2 / n
+
     @functools.cached_property
     def values(self):
         # (NT, NY, NX, 1)
@@ -476,15 +1159,38 @@ class TimeSeqData(object):
         data = np.stack((x.values, y.values, t.values, data.values), axis=-1)
         return data.reshape((-1, 4))
 
+    def flt_x_yband_t_value(self, rows: slice) -> np.ndarray:
+        """the x, y, time and result of fargo outputs in a radial band
+
+            only the rows of the band are read from each file (seek by byte offset), unless
+            ``xarray`` is already loaded
+
+        :param rows: contiguous slice along y (r), e.g. ``slice(0, 1)`` for the inner boundary
+        :return: (N, 4), N = NT * len(band) * NX
+        """
+        if "xarray" in self.__dict__:
+            values = self.xarray.values[:, rows]
+        else:
+            values = read_frames(
+                self.file_list,
+                int(self.setup["NY"]),
+                int(self.setup["NX"]),
+                max_workers=self.max_workers,
+                file_dtype=self.file_dtype,
+                dtype=self.dtype,
+                rows=rows,
+            )
+        t, y, x = np.meshgrid(self.t, self.y[rows], self.x, indexing="ij")
+        data = np.stack((x, y, t, values), axis=-1)
+        return data.reshape((-1, 4))
+
     @functools.cached_property
     def flt_x_ymin_t_value(self) -> np.ndarray:
-        data_list = [frame.x_ymin_t_value for frame in self.frames]
-        return np.vstack(data_list)
+        return self.flt_x_yband_t_value(slice(0, 1))
 
     @functools.cached_property
     def flt_x_ymax_t_value(self) -> np.ndarray:
-        data_list = [frame.x_ymax_t_value for frame in self.frames]
-        return np.vstack(data_list)
+        return self.flt_x_yband_t_value(slice(-1, None))
 
     @functools.cached_property
     def flt_r_theta_t_value(self) -> np.ndarray:
@@ -508,6 +1214,66 @@ class TimeSeqData(object):
     def flt_rmax_theta_t_value(self) -> np.ndarray:
         return self.flt_x_ymax_t_value[:, [1, 0, 2, 3]]
 
+    def points_at(self, t_index, r_index, theta_index) -> np.ndarray:
+        """points of the stacked frames at the given indices, the coordinates are computed from the indices
+
+        :param t_index: (N,) indices along t
+        :param r_index: (N,) indices along r (y)
+        :param theta_index: (N,) indices along theta (x)
+        :return: (N, 4), the r, \theta, time and value, the same columns as ``flt_r_theta_t_value``
+        """
+        values = self.xarray.values
+        return np.stack(
+            [
+                self.y[r_index],
+                self.x[theta_index],
+                self.t[t_index],
+                values[t_index, r_index, theta_index],
+            ],
+            axis=-1,
+        )
+
+    def sample_points(self, n: int, seed=None, stratified: bool = False) -> np.ndarray:
+        """draw random points without building ``flt_r_theta_t_value``
+
+        :param n: number of points
+        :param seed: seed or ``np.random.Generator``
+        :param stratified: if True every frame contributes n // NT points, the remaining
+            n % NT points come from distinct random frames, otherwise frames are drawn uniformly
+        :return: (n, 4), the r, \theta, time and value
+        """
+        rng = np.random.default_rng(seed)
+        nt, ny, nx = len(self.file_list), len(self.y), len(self.x)
+        if stratified:
+            t_index = np.concatenate(
+                [
+                    np.repeat(np.arange(nt), n // nt),
+                    rng.choice(nt, n % nt, replace=False),
+                ]
+            )
+        else:
+            t_index = rng.integers(nt, size=n)
+        r_index = rng.integers(ny, size=n)
+        theta_index = rng.integers(nx, size=n)
+        return self.points_at(t_index, r_index, theta_index)
+
+    def iter_point_batches(
+        self, batch_size: int, n_batches: int = None, seed=None, stratified=False
+    ):
+        """minibatches of random points, see ``sample_points``
+
+        :param batch_size: number of points per batch
+        :param n_batches: number of batches, endless if None
+        :param seed: seed or ``np.random.Generator``
+        :param stratified: passed to ``sample_points``
+        :return: generator of (batch_size, 4) arrays
+        """
+        rng = np.random.default_rng(seed)
+        i = 0
+        while n_batches is None or i < n_batches:
+            yield self.sample_points(batch_size, seed=rng, stratified=stratified)
+            i += 1
+
     def plot_mean_over_x(
         self,
         period_of_t_step,
@@ -515,9 +1281,20 @@ class TimeSeqData(object):
         legend_prec: int = 3,
         ymin=None,
         ymax=None,
+        mean_over_x: np.ndarray = None,
     ) -> matplotlib.figure.Figure:
-        value_list = [frame.mean_value_over_x for frame in self.frames]
-        value_list = value_list[::period_of_t_step]
+        """
+
+        :param mean_over_x: (NT, NY) precomputed means of every frame, e.g. from ``OutputDir.radial_profiles``,
+            computed from the frames if None
+        """
+        if mean_over_x is not None:
+            value_list = mean_over_x[::period_of_t_step]
+        else:
+            # subsample before computing the means, so that skipped frames are not read
+            value_list = [
+                frame.mean_value_over_x for frame in self.frames[::period_of_t_step]
+            ]
         t_list = self.t[::period_of_t_step]
 
         fig, ax = plt.subplots(1, 1, figsize=figsize)
@@ -549,9 +1326,7 @@ class TimeSeqData(object):
         plt.title(f"{self.phys_var_type}")
 
         # get vmin, vmax
-        values = self.flt_xyt_value[:, -1]
-        vmin = np.min(values)
-        vmax = np.max(values)
+        vmin, vmax = self.min_max()
 
         aspect = (np.max(self.x) - np.min(self.x)) / (np.max(self.y) - np.min(self.y))
         extent = [
@@ -563,7 +1338,9 @@ class TimeSeqData(object):
 
         artists = []
         for t_step, file in enumerate(self.file_list):
-            frame = FrameData(file, self.setup, self.y, self.x)
+            frame = FrameData(
+                file, self.setup, self.y, self.x, mmap=self.mmap, dtype=self.file_dtype
+            )
             im = plt.imshow(
                 frame.value,
                 aspect=aspect,
@@ -586,33 +1363,56 @@ class TimeSeqData(object):
             os.path.join(self.output_dir, self.phys_var_type + "-simulated" + ".mp4")
         )
 
+    def polar_to_cartesian_map(self, nxy) -> PolarToCartesianMap:
+        """the ``PolarToCartesianMap`` of ``FrameData.to_cartesian``, shared by all frames"""
+        return get_polar_to_cartesian_map(
+            nxy,
+            nr=len(self.y),
+            ntheta=len(self.x),
+            rmin=float(np.amin(self.y)),
+            rmax=float(np.amax(self.y)),
+            theta_min=float(np.amin(self.x)),
+            theta_max=float(np.amax(self.x)),
+        )
+
+    def iter_cartesian(self, nxy=1000, batch_size: int = 1):
+        """``FrameData.to_cartesian`` of every frame, the frames are read and mapped in blocks
+
+        :param nxy: number of pixels along x and y
+        :param batch_size: passed to ``iter_frames``
+        :return: generator of (t, image), image has shape (nxy, nxy)
+        """
+        polar_to_cartesian = self.polar_to_cartesian_map(nxy)
+        for t, values in self.iter_frames(batch_size):
+            images = polar_to_cartesian(values, max_workers=self.max_workers)
+            yield from zip(t, images)
+
     def get_single_frame_cartesian(self, nxy=1000):
         # get vmin, vmax
-        values = self.flt_xyt_value[:, -1]
-        vmin = np.min(values)
-        vmax = np.max(values)
+        vmin, vmax = self.min_max()
+        rmax = np.amax(self.y)
 
-        for i_step, frame in enumerate(self.frames):
+        for i_step, (t, image) in enumerate(self.iter_cartesian(nxy)):
             plt.figure()
             plt.xlabel(r"$x/R_0$")
             plt.ylabel(r"$y/R_0$")
             plt.title(f"{self.phys_var_type}")
 
             plt.imshow(
-                frame.to_cartesian(nxy),
+                image,
                 origin="lower",
                 extent=[
-                    -frame.ymax,
-                    frame.ymax,
-                    -frame.ymax,
-                    frame.ymax,
+                    -rmax,
+                    rmax,
+                    -rmax,
+                    rmax,
                 ],
                 aspect="equal",
                 vmin=vmin,
                 vmax=vmax,
             )
             plt.annotate(
-                f"t = {frame.time/(2*np.pi):.2f} orbit",
+                f"t = {t/(2*np.pi):.2f} orbit",
                 xy=(0.1, 0.1),
                 xycoords="axes fraction",
                 c="white",
@@ -636,28 +1436,26 @@ class TimeSeqData(object):
         plt.title(f"{self.phys_var_type}")
 
         # get vmin, vmax
-        values = self.flt_xyt_value[:, -1]
-        vmin = np.min(values)
-        vmax = np.max(values)
+        vmin, vmax = self.min_max()
+        rmax = np.amax(self.y)
 
         artists = []
-        for t_step, file in enumerate(self.file_list):
-            frame = FrameData(file, self.setup, self.y, self.x)
+        for t_step, (t, image) in enumerate(self.iter_cartesian(nxy)):
             im = plt.imshow(
-                frame.to_cartesian(nxy),
+                image,
                 origin="lower",
                 extent=[
-                    -frame.ymax,
-                    frame.ymax,
-                    -frame.ymax,
-                    frame.ymax,
+                    -rmax,
+                    rmax,
+                    -rmax,
+                    rmax,
                 ],
                 aspect="equal",
                 vmin=vmin,
                 vmax=vmax,
             )
             annotation = plt.annotate(
-                f"t = {frame.time:.2f}",
+                f"t = {t:.2f}",
                 xy=(0.1, 0.1),
                 xycoords="axes fraction",
                 c="white",
@@ -673,3 +1471,529 @@ class TimeSeqData(object):
                 self.phys_var_type + "-simulated" + "-cartesian" + ".mp4",
             )
         )
+
+
+def shared_frames(arrays: dict) -> xr.Dataset:
+    """merge DataArrays along ``t`` without padding, only the frames present in every array are kept
+
+    :param arrays: {name: DataArray with a ``t`` dimension}
+    :return: Dataset
+    """
+    aligned = xr.align(*arrays.values(), join="inner", exclude=["r", "r_min"])
+    return xr.Dataset(dict(zip(arrays, aligned)))
+
+
+class OutputDir(object):
+    """One FARGO3D outputs directory, ``variables.par``, the coordinates and the file index are parsed once
+    and shared by every field (gas, dust fluids, energy).
+
+    fields are named after the files, e.g. ``gasdens``, ``gasvx``, ``gasenergy``, ``dust1dens``.
+    """
+
+    FILE_PATTERN = OUTPUT_FILE_PATTERN
+    RADIAL_PROFILES = "radial_profiles.nc"
+
+    def __init__(
+        self,
+        output_dir: str,
+        mmap: bool = False,
+        max_workers: int = 1,
+        verbose: bool = False,
+        t_min: float = None,
+        t_max: float = None,
+        stride: int = 1,
+        frame_indices=None,
+        dtype=None,
+        cache: FrameCache = None,
+    ):
+        """
+
+        :param str output_dir: the directory path of the FARGO3D outputs
+        :param bool mmap: if True, frames are memory-mapped read-only instead of read into memory
+        :param int max_workers: number of threads reading frames concurrently, shared by all fields
+        :param bool verbose: print the reading throughput
+        :param t_min: see ``select_files``
+        :param t_max: see ``select_files``
+        :param stride: see ``select_files``
+        :param frame_indices: see ``select_files``, negative positions are resolved once for all fields,
+            see ``resolve_frame_indices``
+        :param dtype: dtype of the arrays, the precision of the files if None
+        :param FrameCache cache: on-disk cache of the stacked frames of every field, not used if None
+        """
+        self.output_dir = output_dir
+        self.mmap = mmap
+        self.max_workers = max_workers
+        self.verbose = verbose
+        self.t_min = t_min
+        self.t_max = t_max
+        self.stride = stride
+        self.frame_indices = frame_indices
+        self.dtype = dtype
+        self.cache = cache
+        self.setup = get_setup(self.output_dir)
+        self.coor = Coor(self.output_dir, self.setup)
+
+    @functools.cached_property
+    def manifest(self) -> dict:
+        """records of all output files of the directory, see ``scan_outputs``
+
+        :return: {file name: record}
+        """
+        return scan_outputs(self.output_dir, self.setup)
+
+    @functools.cached_property
+    def file_index(self) -> dict:
+        """all output files of the directory, from one directory scan
+
+        :return: {field: file paths sorted by frame index}
+        """
+        return group_by_field(self.output_dir, self.manifest)
+
+    @property
+    def fields(self) -> list:
+        return list(self.file_index)
+
+    def rescan(self):
+        """forget the file index, so that the next access sees the files written since the last scan"""
+        self.__dict__.pop("manifest", None)
+        self.__dict__.pop("file_index", None)
+        self.__dict__.pop("file_dtype", None)
+
+    def complete_frame_indices(self, fields=None) -> list:
+        """frame indices whose files exist with the full size (NX * NY values) for every field
+
+        a frame that FARGO3D is still writing is not complete.
+
+        :param fields: field names, all fields if None
+        :return: sorted frame indices
+        """
+        fields = self.fields if fields is None else list(fields)
+        complete = None
+        for field in fields:
+            indices = {
+                record["frame_index"]
+                for record in self.manifest.values()
+                if record["field"] == field and record["complete"]
+            }
+            complete = indices if complete is None else complete & indices
+        return sorted(complete or [])
+
+    def resolve_frame_indices(self, fields=None):
+        """replace the negative positions of ``frame_indices`` by frame indices, once for all fields
+
+        positions count from the end of the frames complete in every field, so that e.g. -1 is the same
+        frame for all fields of a run that is still being written, see ``complete_frame_indices``.
+
+        :param fields: field names, all fields if None
+        """
+        if self.frame_indices is None or all(i >= 0 for i in self.frame_indices):
+            return
+        complete = self.complete_frame_indices(fields)
+        self.frame_indices = sorted(
+            {
+                i if i >= 0 else complete[i]
+                for i in self.frame_indices
+                if i >= -len(complete)
+            }
+        )
+
+    def check_frames(
+        self, fields=None, on_bad_frame: str = "fail", checksum: bool = False
+    ) -> list:
+        """integrity pre-check of the selected frames from the file sizes of the manifest, no frame is read
+
+        a frame is bad if the file of one of the fields is missing or does not hold NY * NX values,
+        e.g. the last frame of a run that crashed or is still running.
+
+        :param fields: field names, all fields if None
+        :param on_bad_frame: 'fail' raises a ValueError, 'skip' drops the bad frames from the selection,
+            'truncate' drops the bad frames and every frame after the first bad one
+        :param checksum: if True, read every file and compare its CRC-32 with the one recorded in the manifest by
+            the first such pass, the frames whose files differ are bad, see ``scan_outputs``
+        :return: sorted frame indices of the bad frames
+        """
+        if on_bad_frame not in ["fail", "skip", "truncate"]:
+            raise ValueError(
+                f"{on_bad_frame}, expect one of ['fail', 'skip', 'truncate']"
+            )
+        if checksum:
+            self.__dict__["manifest"] = scan_outputs(
+                self.output_dir, self.setup, checksum=True
+            )
+            self.__dict__.pop("file_index", None)
+        fields = self.fields if fields is None else list(fields)
+        self.resolve_frame_indices(fields)
+
+        selected, complete = set(), None
+        for field in fields:
+            # stride is applied after the bad frames are dropped
+            file_list = select_files(
+                self.file_index.get(field, []),
+                self.setup,
+                t_min=self.t_min,
+                t_max=self.t_max,
+                frame_indices=self.frame_indices,
+            )
+            records = [self.manifest[os.path.basename(file)] for file in file_list]
+            selected |= {record["frame_index"] for record in records}
+            indices = {
+                record["frame_index"] for record in records if record["complete"]
+            }
+            complete = indices if complete is None else complete & indices
+        good = complete or set()
+        bad = sorted(selected - good)
+
+        if bad and on_bad_frame == "fail":
+            raise ValueError(
+                f"{self.output_dir}: frames {bad} are missing or incomplete in {fields}"
+            )
+        if bad and on_bad_frame == "truncate":
+            good = {i for i in good if i < bad[0]}
+        if bad:
+            self.frame_indices = sorted(good)
+        return bad
+
+    @functools.cached_property
+    def file_dtype(self) -> np.dtype:
+        """precision of the output files, see ``get_realtype``"""
+        file_path = next(
+            (
+                os.path.join(self.output_dir, file_name)
+                for file_name, record in self.manifest.items()
+                if record["complete"]
+            ),
+            None,
+        )
+        return get_realtype(self.setup, file_path)
+
+    def file_list(self, field: str) -> list:
+        """selected files of one field
+
+        :param field: e.g. ``gasdens``
+        :return: file paths sorted by frame index
+        """
+        if field not in self.file_index:
+            raise KeyError(
+                f"{field} not found in {self.output_dir}, expect {self.fields}"
+            )
+        self.resolve_frame_indices()
+        return select_files(
+            self.file_index[field],
+            self.setup,
+            t_min=self.t_min,
+            t_max=self.t_max,
+            stride=self.stride,
+            frame_indices=self.frame_indices,
+        )
+
+    def coordinates(self, field: str) -> tuple:
+        """coordinate values of the cells of one field, **vx** is x staggered and **vy** is y staggered
+
+        :param field: e.g. ``gasdens``
+        :return: (y, x), i.e. (r, theta)
+        """
+        quantity = self.FILE_PATTERN.match(field + "0.dat").group("quantity")
+        if quantity == "vx":
+            return self.coor.y_center, self.coor.x_min
+        elif quantity == "vy":
+            return self.coor.y_min, self.coor.x_center
+        else:
+            return self.coor.y_center, self.coor.x_center
+
+    def phys_var_type(self, field: str) -> str:
+        """``phys_var_type`` attribute of the DataArray, the same as ``TimeSeqData`` for the gas fluid
+
+        :param field: e.g. ``gasdens``
+        :return: e.g. ``dens`` for ``gasdens``, ``dust1dens`` for ``dust1dens``
+        """
+        match = self.FILE_PATTERN.match(field + "0.dat")
+        if match.group("fluid") == "gas":
+            return match.group("quantity")
+        return field
+
+    def read(self, fields=None) -> dict:
+        """read several fields at once, all files go through one thread pool into one buffer
+
+        :param fields: field names, all fields if None
+        :return: {field: DataArray with shape (NT, NY, NX)}, in the same format as ``TimeSeqData.xarray``
+        """
+        fields = self.fields if fields is None else list(fields)
+        self.resolve_frame_indices(fields)
+        file_lists = {field: self.file_list(field) for field in fields}
+        dtype = self.file_dtype if self.dtype is None else np.dtype(self.dtype)
+
+        values = {}
+        if self.cache is not None:
+            for field in fields:
+                cached = self.cache.load(file_lists[field], dtype)
+                if cached is not None:
+                    values[field] = cached
+        missing = [field for field in fields if field not in values]
+        if missing:
+            stacked = read_frames(
+                [file for field in missing for file in file_lists[field]],
+                int(self.setup["NY"]),
+                int(self.setup["NX"]),
+                mmap=self.mmap,
+                max_workers=self.max_workers,
+                verbose=self.verbose,
+                file_dtype=self.file_dtype,
+                dtype=dtype,
+            )
+            start = 0
+            for field in missing:
+                values[field] = stacked[start : start + len(file_lists[field])]
+                start += len(file_lists[field])
+                if self.cache is not None:
+                    self.cache.store(file_lists[field], values[field])
+
+        arrays = {}
+        for field in fields:
+            y, x = self.coordinates(field)
+            array = xr.DataArray(
+                values[field],
+                coords={
+                    "t": [
+                        get_frame_time(file, self.setup) for file in file_lists[field]
+                    ],
+                    "r": y,
+                    "theta": x,
+                },
+                dims=["t", "r", "theta"],
+            )
+            array.attrs = self.setup
+            array.attrs["phys_var_type"] = self.phys_var_type(field)
+            arrays[field] = array
+        return arrays
+
+    def profile_signature(self, field: str) -> str:
+        """what the radial profiles of one field are validated against, the name, size and mtime of every selected file"""
+        return json.dumps(
+            [
+                [os.path.basename(file), stat.st_size, stat.st_mtime_ns]
+                for file, stat in (
+                    (file, os.stat(file)) for file in self.file_list(field)
+                )
+            ]
+        )
+
+    def compute_radial_profiles(
+        self, fields=None, stats=("mean",), percentiles=(), batch_size: int = 1
+    ) -> xr.Dataset:
+        """azimuthal statistics of every frame and field in one streaming pass, see ``azimuthal_stats``
+
+        the frames are read in blocks of ``batch_size``, the blocks of all fields are spread over
+        ``max_workers`` threads, at most ``max_workers * batch_size`` frames are held in memory.
+
+        :param fields: field names, all fields if None
+        :param stats: passed to ``azimuthal_stats``
+        :param percentiles: passed to ``azimuthal_stats``
+        :param batch_size: number of frames per block
+        :return: Dataset with variables ``<field>_<stat>`` of shape (NT, NY), **vy** uses ``r_min`` instead of ``r``,
+            restricted to the frames shared by all fields
+        """
+        return shared_frames(
+            self.radial_profile_arrays(fields, stats, percentiles, batch_size)
+        )
+
+    def radial_profile_arrays(
+        self, fields=None, stats=("mean",), percentiles=(), batch_size: int = 1
+    ) -> dict:
+        """``compute_radial_profiles`` before the fields are aligned, every field keeps all its selected frames
+
+        :return: {``<field>_<stat>``: DataArray of shape (NT, NY)}
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be a positive integer.")
+        fields = self.fields if fields is None else list(fields)
+        self.resolve_frame_indices(fields)
+        file_lists = {field: self.file_list(field) for field in fields}
+        dtype = self.file_dtype if self.dtype is None else np.dtype(self.dtype)
+        ny, nx = int(self.setup["NY"]), int(self.setup["NX"])
+
+        stacked = {}
+        if self.cache is not None:
+            for field in fields:
+                cached = self.cache.load(file_lists[field], dtype)
+                if cached is not None:
+                    stacked[field] = cached
+        blocks = [
+            (field, i)
+            for field in fields
+            for i in range(0, len(file_lists[field]), batch_size)
+        ]
+
+        def reduce(block):
+            field, i = block
+            if field in stacked:
+                values = stacked[field][i : i + batch_size]
+            else:
+                values = read_frames(
+                    file_lists[field][i : i + batch_size],
+                    ny,
+                    nx,
+                    mmap=self.mmap,
+                    file_dtype=self.file_dtype,
+                    dtype=dtype,
+                )
+            return azimuthal_stats(values, stats, percentiles)
+
+        start = time.perf_counter()
+        if self.max_workers == 1:
+            reduced = [reduce(block) for block in blocks]
+        else:
+            with concurrent.futures.ThreadPoolExecutor(self.max_workers) as executor:
+                reduced = list(executor.map(reduce, blocks))
+        elapsed = time.perf_counter() - start
+        if self.verbose:
+            n_frames = sum(len(file_list) for file_list in file_lists.values())
+            print(
+                f"reduced {n_frames} frames in {elapsed:.2f} s, "
+                f"{n_frames / max(elapsed, 1e-9):.1f} frames/s"
+            )
+
+        data_vars = {}
+        for field in fields:
+            y, _ = self.coordinates(field)
+            quantity = self.FILE_PATTERN.match(field + "0.dat").group("quantity")
+            r_dim = "r_min" if quantity == "vy" else "r"
+            coords = {
+                "t": [get_frame_time(file, self.setup) for file in file_lists[field]],
+                r_dim: y,
+            }
+            field_blocks = [
+                result for (name, _), result in zip(blocks, reduced) if name == field
+            ]
+            for name in field_blocks[0] if field_blocks else []:
+                data_vars[f"{field}_{name}"] = xr.DataArray(
+                    np.concatenate([result[name] for result in field_blocks]),
+                    coords=coords,
+                    dims=["t", r_dim],
+                )
+        return data_vars
+
+    def radial_profiles(
+        self,
+        fields=None,
+        stats=("mean",),
+        percentiles=(),
+        batch_size: int = 1,
+        sidecar: bool = True,
+    ) -> xr.Dataset:
+        """``compute_radial_profiles``, reused from the sidecar file ``radial_profiles.nc`` of ``output_dir``
+
+        the profiles of a field are recomputed when the sidecar lacks a requested variable of the field or
+        when its selected files have changed since they were written, the profiles of other fields are kept.
+
+        :param fields: field names, all fields if None
+        :param stats: passed to ``azimuthal_stats``
+        :param percentiles: passed to ``azimuthal_stats``
+        :param batch_size: passed to ``compute_radial_profiles``
+        :param sidecar: if False, the sidecar is neither read nor written
+        :return: Dataset with variables ``<field>_<stat>`` of shape (NT, NY), restricted to the frames
+            shared by all fields, e.g. the frames written for every field of a run that is still running
+        """
+        fields = self.fields if fields is None else list(fields)
+        self.resolve_frame_indices(fields)
+        if not sidecar:
+            return self.compute_radial_profiles(fields, stats, percentiles, batch_size)
+
+        names = {
+            field: [
+                f"{field}_{name}"
+                for name in list(stats) + [f"p{q:g}" for q in percentiles]
+            ]
+            for field in fields
+        }
+        signatures = {field: self.profile_signature(field) for field in fields}
+        sidecar_file = os.path.join(self.output_dir, self.RADIAL_PROFILES)
+        # in the sidecar, every field has its own time dimension ``t_<field>``,
+        # so fields saved with different frame selections are never aligned
+        saved = {}
+        if os.path.exists(sidecar_file):
+            with xr.open_dataset(sidecar_file) as dataset:
+                for name, array in dataset.data_vars.items():
+                    field = array.attrs.get("field")
+                    # drop the profiles of fields whose files have changed
+                    if f"t_{field}" in array.dims and (
+                        field not in signatures
+                        or array.attrs.get("signature") == signatures[field]
+                    ):
+                        saved[name] = array.load()
+        missing = [
+            field for field in fields if any(name not in saved for name in names[field])
+        ]
+        if missing:
+            computed = self.radial_profile_arrays(
+                missing, stats, percentiles, batch_size
+            )
+            for field in missing:
+                for name in names[field]:
+                    saved[name] = computed[name].rename(t=f"t_{field}")
+                    saved[name].attrs = {
+                        "field": field,
+                        "signature": signatures[field],
+                    }
+            # write to a temporary file first, readers never see a partial sidecar
+            xr.Dataset(saved).to_netcdf(sidecar_file + ".tmp")
+            os.replace(sidecar_file + ".tmp", sidecar_file)
+        return shared_frames(
+            {
+                name: saved[name].rename({f"t_{field}": "t"})
+                for field in fields
+                for name in names[field]
+            }
+        )
+
+    def dataarray(self, field: str) -> xr.DataArray:
+        """
+
+        :param field: e.g. ``gasdens``
+        :return: (NT, NY, NX), in the same format as ``TimeSeqData.xarray``
+        """
+        return self.read([field])[field]
+
+    def dataset(self, fields=None) -> xr.Dataset:
+        """fields as one Dataset with shared ``t`` coordinates
+
+        staggered fields get their own dimension: **vx** uses ``theta_min`` instead of ``theta``,
+        **vy** uses ``r_min`` instead of ``r``.
+
+        :param fields: field names, all fields if None
+        :return: Dataset
+        """
+        arrays = self.read(fields)
+        data_vars = {}
+        for field, array in arrays.items():
+            quantity = self.FILE_PATTERN.match(field + "0.dat").group("quantity")
+            if quantity == "vx":
+                array = array.rename(theta="theta_min")
+            elif quantity == "vy":
+                array = array.rename(r="r_min")
+            array.attrs = {"phys_var_type": array.attrs["phys_var_type"]}
+            data_vars[field] = array
+        return xr.Dataset(data_vars, attrs=dict(self.setup))
+
+    def time_seq_data(self, phys_var_type: str) -> TimeSeqData:
+        """``TimeSeqData`` of the gas fluid that shares the setup, coordinates and file index of this object
+
+        :param phys_var_type: expect ['dens', 'vx', 'vy']
+        :return: TimeSeqData
+        """
+        self.resolve_frame_indices()
+        return TimeSeqData(
+            self.output_dir,
+            phys_var_type,
+            mmap=self.mmap,
+            max_workers=self.max_workers,
+            verbose=self.verbose,
+            t_min=self.t_min,
+            t_max=self.t_max,
+            stride=self.stride,
+            frame_indices=self.frame_indices,
+            dtype=self.dtype,
+            cache=self.cache,
+            setup=self.setup,
+            coor=self.coor,
+            file_list=self.file_index.get("gas" + phys_var_type, []),
+        )
@@ -1,10 +1,16 @@
 import argparse
+import concurrent.futures
+import contextlib
+import os
 import pathlib
 import shutil
+import time
 
 import xarray as xr
 import yaml
 
+from .fargoData import OutputDir, get_frame_time
+
 
 def get_config():
     parser = argparse.ArgumentParser()
@@ -15,6 +21,30 @@ def get_config():
         "--collecting_mode", type=str, choices=["all", "last_t_frame"], default="all"
     )
     parser.add_argument("--ymax", type=float)
+    parser.add_argument(
+        "--dtype",
+        type=str,
+        choices=["float32", "float64"],
+        help="Precision of the collected data, the precision of the runs if not set.",
+    )
+    parser.add_argument(
+        "--on_bad_frame",
+        type=str,
+        choices=["fail", "skip", "truncate"],
+        help="Check the raw frames of every run first. A run with a missing or incomplete frame "
+        "fails the collection, is skipped, or is truncated before its first bad frame. "
+        "No check if not set.",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Number of runs read in parallel."
+    )
+    parser.add_argument(
+        "--pool",
+        type=str,
+        choices=["threads", "processes"],
+        default="threads",
+        help="Read the runs in a thread pool, or in a process pool when the reads are CPU bound.",
+    )
     config = parser.parse_args()
     return config
 
@@ -26,16 +56,249 @@ def select_last_time_frame(data: xr.DataArray):
     return data_t
 
 
+def crop_bad_frames(data: xr.DataArray, t_bad=None):
+    if t_bad is None:
+        return data
+    return data.isel(t=data.t < t_bad)
+
+
+def open_run(data_file, t_bad=None, ymax=None) -> xr.DataArray:
+    """Open one run lazily, only the frames before ``t_bad`` and the radii below ``ymax`` are read.
+
+    Args:
+        data_file: ``test_*.nc`` of the run.
+        t_bad: time of the first bad frame, see ``crop_bad_frames``.
+        ymax: radial crop, no crop if None.
+
+    Returns:
+        the lazily indexed run.
+    """
+    data = crop_bad_frames(xr.open_dataarray(data_file), t_bad)
+    if ymax:
+        data = data.isel({"r": data.r < ymax})
+    return data
+
+
+def read_run(data_file, t_bad=None, ymax=None, dtype=None):
+    """values of ``open_run``, what the workers read"""
+    with open_run(data_file, t_bad, ymax) as data:
+        values = data.values
+    return values if dtype is None else values.astype(dtype, copy=False)
+
+
+def _read_run_in(executor, *args):
+    return executor.submit(read_run, *args).result()
+
+
+def lazy_run(data_file, t_bad=None, ymax=None, dtype=None, executor=None):
+    """``open_run`` backed by one dask chunk, only the metadata is read until the chunk is computed.
+
+    Args:
+        data_file, t_bad, ymax, dtype: see ``read_run``.
+        executor: ``concurrent.futures`` executor the chunk is read in, e.g. a process pool,
+            the dask worker reads it if None.
+
+    Returns:
+        xr.DataArray with the coords and attrs of the run.
+    """
+    try:
+        import dask
+        import dask.array as da
+    except ImportError as e:
+        raise ImportError("lazy_run requires dask, `pip install dask`") from e
+
+    with open_run(data_file, t_bad, ymax) as data:
+        if executor is None:
+            task = dask.delayed(read_run, pure=True)(data_file, t_bad, ymax, dtype)
+        else:
+            task = dask.delayed(_read_run_in, pure=False)(
+                executor, data_file, t_bad, ymax, dtype
+            )
+        values = da.from_delayed(task, data.shape, dtype=dtype or data.dtype)
+        return data.copy(data=values)
+
+
+def discover_runs(runs_dir, runs) -> dict:
+    """Find the outputs directory of every run in one pass over ``runs_dir``.
+
+    Args:
+        runs_dir: directory of the run directories, each named after its run id followed by any suffix.
+        runs: run ids.
+
+    Returns:
+        {run id: ``fargo3d/outputs`` directory of the run}
+    """
+    runs_dir = pathlib.Path(runs_dir)
+    lengths = sorted({len(run) for run in runs})
+    matches = {run: [] for run in runs}
+    with os.scandir(runs_dir) as entries:
+        for entry in entries:
+            for length in lengths:
+                if entry.name[:length] in matches:
+                    matches[entry.name[:length]].append(entry.name)
+
+    outputs_dir = {}
+    for run in runs:
+        run_outputs_dir = [
+            runs_dir / name / "fargo3d" / "outputs"
+            for name in matches[run]
+            if (runs_dir / name / "fargo3d" / "outputs").is_dir()
+        ]
+        if len(run_outputs_dir) != 1:
+            raise ValueError(f"run id={run}, failed to match run dir.")
+        run_outputs_dir = run_outputs_dir[0]
+        # check if files exist
+        file_names = set(os.listdir(run_outputs_dir))
+        for phys_var_type in ["dens", "vy", "vx"]:
+            if f"test_{phys_var_type}.nc" not in file_names:
+                raise FileNotFoundError(
+                    f"{run_outputs_dir / f'test_{phys_var_type}.nc'} not found."
+                )
+        outputs_dir[run] = run_outputs_dir
+    return outputs_dir
+
+
 def yaml_file_check(fargo_runs):
     cri = [key in fargo_runs for key in ["runs", "parameters"]]
     return all(cri)
 
 
-def main(runs_dir, yaml_file, save_dir, collecting_mode, ymax):
+def check_runs(outputs_dir, runs, on_bad_frame):
+    """Integrity pre-check of the raw frames of every run, see ``OutputDir.check_frames``.
+
+    Args:
+        outputs_dir: outputs directory of each run.
+        runs: run ids.
+        on_bad_frame: "fail", "skip" or "truncate".
+
+    Returns:
+        the outputs directories and run ids that are kept, and {run id: time of the first bad frame}
+        for the runs to truncate.
+    """
+    kept_dirs, kept_runs, t_bad = [], [], {}
+    for odir, run in zip(outputs_dir, runs):
+        output = OutputDir(str(odir))
+        bad_frames = output.check_frames(
+            ["gasdens", "gasvx", "gasvy"],
+            "truncate" if on_bad_frame == "skip" else on_bad_frame,
+        )
+        if bad_frames:
+            print(f"run id={run}: frames {bad_frames} are missing or incomplete")
+            if on_bad_frame == "skip":
+                continue
+            t_bad[run] = get_frame_time(f"gasdens{bad_frames[0]}.dat", output.setup)
+        kept_dirs.append(odir)
+        kept_runs.append(run)
+    return kept_dirs, kept_runs, t_bad
+
+
+def collect_phys_var(
+    outputs_dir,
+    fargo_runs,
+    save_file,
+    phys_var_type,
+    collecting_mode,
+    ymax,
+    dtype,
+    t_bad,
+    fargo_setups=None,
+    workers=1,
+    executor=None,
+):
+    """collect one physical variable of all runs to ``save_file``, see ``main``
+
+    Returns:
+        the attributes shared by the runs, ``fargo_setups`` if given
+    """
+    try:
+        import dask.diagnostics
+    except ImportError as e:
+        raise ImportError("collect_phys_var requires dask, `pip install dask`") from e
+
+    # open xarrays lazily, cropped on the way
+    if collecting_mode == "all":
+        # one dask chunk per run, a run is only read when its slab is written
+        xarrays = [
+            lazy_run(
+                odir / f"test_{phys_var_type}.nc", t_bad.get(run), ymax, dtype, executor
+            )
+            for odir, run in zip(outputs_dir, fargo_runs["runs"])
+        ]
+    elif collecting_mode == "last_t_frame":
+        xarrays = [
+            select_last_time_frame(
+                open_run(odir / f"test_{phys_var_type}.nc", t_bad.get(run), ymax)
+            )
+            for odir, run in zip(outputs_dir, fargo_runs["runs"])
+        ]
+    else:
+        raise NotImplementedError
+    # cast run by run, so that only one run is held in both precisions
+    if dtype is not None:
+        xarrays = [array.astype(dtype) for array in xarrays]
+    # make `run` (run id) as one of the dimensional coordinates
+    # other dimensional coordinates are spatial/temporal coordinates.
+    # add parameters as non-dimensional coordinates
+    # the line below collect parameters (non-dimensional coords) for each run
+    new_dim = {
+        p: ("run", [float(array.attrs[p]) for array in xarrays])
+        for p in fargo_runs["parameters"]
+    }
+    for p, dim in new_dim.items():
+        if len(set(dim[1])) == 1:
+            raise ValueError(f"{p} is not a variable parameter.")
+    # dimensional coords
+    new_dim.update({"run": fargo_runs["runs"]})
+    # concat xarrays, the coords are assigned after the concat,
+    # the non-dimensional coords of a DataArray dim are not kept by every xarray version
+    xarrays = xr.concat(xarrays, dim="run").assign_coords(new_dim)
+    # remove attributes that are not shared by runs.
+    for p in fargo_runs["parameters"]:
+        xarrays.attrs.pop(p)
+    if fargo_setups is None:
+        fargo_setups = xarrays.attrs
+        fargo_setups.pop("phys_var_type")
+    # ymax is cropped when the runs are read
+    if ymax:
+        xarrays.attrs["YMAX"] = str(ymax)
+        fargo_setups["YMAX"] = str(ymax)
+
+    # save to file, the variable is created with the run dimension first,
+    # then the runs are read and written slab by slab, about ``workers`` runs in memory
+    start = time.perf_counter()
+    with dask.diagnostics.ProgressBar():
+        xarrays.to_netcdf(save_file, compute=False).compute(
+            scheduler="synchronous" if workers == 1 else "threads",
+            num_workers=workers,
+        )
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    print(
+        f"{save_file.name}: {len(xarrays.run)} runs in {elapsed:.2f} s, "
+        f"{len(xarrays.run) / elapsed:.1f} runs/s, "
+        f"{xarrays.nbytes / elapsed / 1e6:.1f} MB/s"
+    )
+    return fargo_setups
+
+
+def main(
+    runs_dir,
+    yaml_file,
+    save_dir,
+    collecting_mode,
+    ymax,
+    dtype=None,
+    on_bad_frame=None,
+    workers=1,
+    pool="threads",
+):
     """Collect all fargo runs, concat data to one file.
 
     Args:
         config:
+        dtype: cast every run to this dtype before concatenating, e.g. "float32".
+        on_bad_frame: see ``check_runs``, the raw frames are not checked if None.
+        workers: number of runs read in parallel, and held in memory, while the collected file is written.
+        pool: "threads" or "processes", what the runs are read in.
 
     Returns:
 
@@ -51,82 +314,44 @@ def main(runs_dir, yaml_file, save_dir, collecting_mode, ymax):
     if not yaml_file_check(fargo_runs):
         raise ValueError("Yaml file does not pass the check.")
 
-    outputs_dir = []
-    for run in fargo_runs["runs"]:
-        run_outputs_dir = list(runs_dir.glob(f"{run}*/fargo3d/outputs"))
-        if len(run_outputs_dir) == 1:
-            run_outputs_dir = run_outputs_dir[0]
-            # check if files exist
-            for phys_var_type in ["dens", "vy", "vx"]:
-                data_file = run_outputs_dir / f"test_{phys_var_type}.nc"
-                if not data_file.exists():
-                    raise FileNotFoundError(f"{data_file} not found.")
-            outputs_dir.append(run_outputs_dir)
-        else:
-            raise ValueError(f"run id={run}, failed to match run dir.")
+    run_outputs_dirs = discover_runs(runs_dir, fargo_runs["runs"])
+    outputs_dir = [run_outputs_dirs[run] for run in fargo_runs["runs"]]
 
-    fargo_setups = None
-    for new_phys_var_type, phys_var_type in zip(
-        ["sigma", "v_r", "v_theta"], ["dens", "vy", "vx"]
-    ):
-        # load xarrays
-        if collecting_mode == "all":
-            xarrays = [
-                xr.load_dataarray(odir / f"test_{phys_var_type}.nc")
-                for odir in outputs_dir
-            ]
-        elif collecting_mode == "last_t_frame":
-            xarrays = [
-                select_last_time_frame(
-                    xr.open_dataarray(odir / f"test_{phys_var_type}.nc")
-                )
-                for odir in outputs_dir
-            ]
-        else:
-            raise NotImplementedError
-        # make `run` (run id) as one of the dimensional coordinates
-        # other dimensional coordinates are spatial/temporal coordinates.
-        # add parameters as non-dimensional coordinates
-        # the line below collect parameters (non-dimensional coords) for each run
-        new_dim = {
-            p: ("run", [float(array.attrs[p]) for array in xarrays])
-            for p in fargo_runs["parameters"]
-        }
-        for p, dim in new_dim.items():
-            if len(set(dim[1])) == 1:
-                raise ValueError(f"{p} is not a variable parameter.")
-        # dimensional coords
-        new_dim.update({"run": fargo_runs["runs"]})
-        # prepare to feed to xr.concat
-        new_dim = xr.DataArray(
-            data=fargo_runs["runs"],
-            coords=new_dim,
-            dims="run",
+    t_bad = {}
+    if on_bad_frame is not None:
+        outputs_dir, fargo_runs["runs"], t_bad = check_runs(
+            outputs_dir, fargo_runs["runs"], on_bad_frame
         )
-        # concat xarrays
-        xarrays = xr.concat(xarrays, dim=new_dim)
-        # remove attributes that are not shared by runs.
-        for p in fargo_runs["parameters"]:
-            xarrays.attrs.pop(p)
-        if fargo_setups is None:
-            fargo_setups = xarrays.attrs
-            fargo_setups.pop("phys_var_type")
-        # crop ymax
-        if ymax:
-            xarrays = xarrays.isel({"r": xarrays.r < ymax})
-            xarrays.attrs["YMAX"] = str(ymax)
-            fargo_setups["YMAX"] = str(ymax)
-
-        # save to file
-        xarrays.to_netcdf(save_dir / f"batch_truth_{new_phys_var_type}.nc")
+
+    fargo_setups = None
+    # the runs are read by the dask threads, or handed over to a process pool
+    executor = None
+    if pool == "processes" and workers > 1:
+        executor = concurrent.futures.ProcessPoolExecutor(workers)
+    with executor or contextlib.nullcontext():
+        for new_phys_var_type, phys_var_type in zip(
+            ["sigma", "v_r", "v_theta"], ["dens", "vy", "vx"]
+        ):
+            fargo_setups = collect_phys_var(
+                outputs_dir,
+                fargo_runs,
+                save_dir / f"batch_truth_{new_phys_var_type}.nc",
+                phys_var_type,
+                collecting_mode,
+                ymax,
+                dtype,
+                t_bad,
+                fargo_setups,
+                workers,
+                executor,
+            )
 
     # save fargo_setups
     with (save_dir / "fargo_setups.yml").open("w") as f:
         yaml.safe_dump(fargo_setups, f)
     # save a arg_groups.yml
     run0 = fargo_runs["runs"][0]
-    arg_groups_file = f"{run0}*/fargo3d/arg_groups.yml"
-    arg_groups_file = list(runs_dir.glob(arg_groups_file))[0]
+    arg_groups_file = run_outputs_dirs[run0].parent / "arg_groups.yml"
     shutil.copy(arg_groups_file, save_dir)
 
 
@@ -138,4 +363,8 @@ if __name__ == "__main__":
         config.save_dir,
         config.collecting_mode,
         ymax=config.ymax,
+        dtype=config.dtype,
+        on_bad_frame=config.on_bad_frame,
+        workers=config.workers,
+        pool=config.pool,
     )
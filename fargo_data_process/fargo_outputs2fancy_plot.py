@@ -4,16 +4,14 @@ import matplotlib.figure
 import matplotlib.pyplot as plt
 import numpy as np
 
-from .config import get_config
+from .config import get_config, make_output_dir
 from .fargoData import TimeSeqData
 
 
 def fancy_suplots(
     data: TimeSeqData, title: str, cmap: str = "Reds", nxy=1000
 ) -> matplotlib.figure.Figure:
-    values = data.flt_xyt_value[:, -1]
-    vmin = np.min(values)
-    vmax = np.max(values)
+    vmin, vmax = data.min_max()
 
     fig = plt.figure(figsize=(9, 3))
     fig.suptitle(title)
@@ -43,19 +41,20 @@ def fancy_suplots(
     return fig
 
 
-def main(output_dir):
+def main(output_dir, **options):
+    output = make_output_dir(output_dir, **options)
 
-    sigma = TimeSeqData(output_dir, phys_var_type="dens")
+    sigma = output.time_seq_data("dens")
     sigma_fig = fancy_suplots(sigma, "$\Sigma$")
     sigma_fig.savefig(
         os.path.join(output_dir, "dens-simulated-cartesian-row.png"), format="png"
     )
-    v_r = TimeSeqData(output_dir, phys_var_type="vy")
+    v_r = output.time_seq_data("vy")
     v_r_fig = fancy_suplots(v_r, "$v_r$")
     v_r_fig.savefig(
         os.path.join(output_dir, "vy-simulated-cartesian-row.png"), format="png"
     )
-    v_theta = TimeSeqData(output_dir, phys_var_type="vx")
+    v_theta = output.time_seq_data("vx")
     v_theta_fig = fancy_suplots(v_theta, "$v_{\\theta}$")
     v_theta_fig.savefig(
         os.path.join(output_dir, "vx-simulated-cartesian-row.png"), format="png"
@@ -63,4 +62,5 @@ def main(output_dir):
 
 
 if __name__ == "__main__":
-    main(get_config().output_dir)
+    config = get_config()
+    main(**vars(config))
@@ -4,7 +4,7 @@ import matplotlib.figure
 import matplotlib.pyplot as plt
 import numpy as np
 
-from .config import get_config
+from .config import get_config, make_output_dir
 from .fargoData import TimeSeqData
 
 
@@ -33,9 +33,7 @@ def fancy_suplots(
         ("$\Sigma$", "$v_r$", "$v_{\\theta}$"),
     ):
         # vmin, vmax
-        values = data.flt_xyt_value[:, -1]
-        vmin = np.min(values)
-        vmax = np.max(values)
+        vmin, vmax = data.min_max()
 
         for ax, frame in zip(
             ax_row, [data.frames[0], data.frames[10], data.frames[20]]
@@ -63,14 +61,16 @@ def fancy_suplots(
     return fig
 
 
-def main(output_dir):
+def main(output_dir, **options):
+    output = make_output_dir(output_dir, **options)
 
-    sigma = TimeSeqData(output_dir, phys_var_type="dens")
-    v_r = TimeSeqData(output_dir, phys_var_type="vy")
-    v_theta = TimeSeqData(output_dir, phys_var_type="vx")
+    sigma = output.time_seq_data("dens")
+    v_r = output.time_seq_data("vy")
+    v_theta = output.time_seq_data("vx")
     fig = fancy_suplots(sigma, vx=v_theta, vy=v_r, title="")
     fig.savefig(os.path.join(output_dir, "all-simulated-cartesian.png"), format="png")
 
 
 if __name__ == "__main__":
-    main(get_config().output_dir)
+    config = get_config()
+    main(**vars(config))
@@ -1,16 +1,17 @@
-from .config import get_config
-from .fargoData import TimeSeqData
+from .config import get_config, make_output_dir
 
 
-def main(output_dir):
+def main(output_dir, **options):
+    output = make_output_dir(output_dir, **options)
 
-    sigma = TimeSeqData(output_dir, phys_var_type="dens")
+    sigma = output.time_seq_data("dens")
     sigma.get_single_frame_cartesian()
-    v_r = TimeSeqData(output_dir, phys_var_type="vy")
+    v_r = output.time_seq_data("vy")
     v_r.get_single_frame_cartesian()
-    v_theta = TimeSeqData(output_dir, phys_var_type="vx")
+    v_theta = output.time_seq_data("vx")
     v_theta.get_single_frame_cartesian()
 
 
 if __name__ == "__main__":
-    main(get_config().output_dir)
+    config = get_config()
+    main(**vars(config))
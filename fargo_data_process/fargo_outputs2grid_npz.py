@@ -2,14 +2,14 @@ import os
 
 import numpy as np
 
-from .config import get_config
-from .fargoData import TimeSeqData
+from .config import get_config, make_output_dir
 
 
-def main(output_dir):
+def main(output_dir, **options):
+    output = make_output_dir(output_dir, **options)
 
     for phys_var_type in ["dens", "vy", "vx"]:
-        var = TimeSeqData(output_dir, phys_var_type)
+        var = output.time_seq_data(phys_var_type)
         np.savez(
             os.path.join(output_dir, phys_var_type + "_" + "grid.npz"),
             t=var.t,
@@ -20,4 +20,5 @@ def main(output_dir):
 
 
 if __name__ == "__main__":
-    main(get_config().output_dir)
+    config = get_config()
+    main(**vars(config))
@@ -2,18 +2,18 @@ import os
 
 from scipy.io import savemat
 
-from .config import get_config
-from .fargoData import TimeSeqData
+from .config import get_config, make_output_dir
 
 
-def main(output_dir):
+def main(output_dir, **options):
     """convert fargo outputs to npz file with (N, 4) shape."""
+    output = make_output_dir(output_dir, **options)
 
-    dens = TimeSeqData(output_dir, phys_var_type="dens").flt_r_theta_t_value
+    dens = output.time_seq_data("dens").flt_r_theta_t_value
     print(f"dens shape {dens.shape}")
-    vx = TimeSeqData(output_dir, phys_var_type="vx").flt_r_theta_t_value
+    vx = output.time_seq_data("vx").flt_r_theta_t_value
     print(f"vx shape {vx.shape}")
-    vy = TimeSeqData(output_dir, phys_var_type="vy").flt_r_theta_t_value
+    vy = output.time_seq_data("vy").flt_r_theta_t_value
     print(f"vy shape {vy.shape}")
     # np.savez(os.path.join(output_dir, 'test_data.npz'), dens=dens, vx=vx, vy=vy)
     savemat(
@@ -23,4 +23,5 @@ def main(output_dir):
 
 
 if __name__ == "__main__":
-    main(get_config().output_dir)
+    config = get_config()
+    main(**vars(config))
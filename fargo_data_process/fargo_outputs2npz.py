@@ -2,21 +2,52 @@ import os
 
 import numpy as np
 
-from .config import get_config
-from .fargoData import TimeSeqData
+from .config import get_parser, make_output_dir
 
 
-def main(output_dir):
-    """convert fargo outputs to npz file with (N, 4) shape."""
+def get_config(args=None):
+    parser = get_parser()
+    parser.add_argument(
+        "--layout",
+        type=str,
+        choices=["table", "grid"],
+        default="table",
+        help="table: (N, 4) arrays of r, theta, t, value. "
+        "grid: (NT, NY, NX) arrays plus their t, r, theta axes.",
+    )
 
-    dens = TimeSeqData(output_dir, phys_var_type="dens").flt_r_theta_t_value
+    return parser.parse_args(args)
+
+
+def main(output_dir, layout="table", **options):
+    """convert fargo outputs to npz file with (N, 4) shape.
+
+    With ``layout="grid"`` the file holds e.g. ``dens`` with shape (NT, NY, NX) and its axes
+    ``dens_t``, ``dens_r``, ``dens_theta`` instead, which avoids repeating the coordinates.
+    """
+    output = make_output_dir(output_dir, **options)
+
+    if layout == "grid":
+        arrays = {}
+        for phys_var_type in ["dens", "vx", "vy"]:
+            var = output.time_seq_data(phys_var_type)
+            arrays[phys_var_type] = var.xarray.values
+            arrays[phys_var_type + "_t"] = var.t
+            arrays[phys_var_type + "_r"] = var.y
+            arrays[phys_var_type + "_theta"] = var.x
+            print(f"{phys_var_type} shape {var.xarray.shape}")
+        np.savez(os.path.join(output_dir, "test_data.npz"), **arrays)
+        return
+
+    dens = output.time_seq_data("dens").flt_r_theta_t_value
     print(f"dens shape {dens.shape}")
-    vx = TimeSeqData(output_dir, phys_var_type="vx").flt_r_theta_t_value
+    vx = output.time_seq_data("vx").flt_r_theta_t_value
     print(f"vx shape {vx.shape}")
-    vy = TimeSeqData(output_dir, phys_var_type="vy").flt_r_theta_t_value
+    vy = output.time_seq_data("vy").flt_r_theta_t_value
     print(f"vy shape {vy.shape}")
     np.savez(os.path.join(output_dir, "test_data.npz"), dens=dens, vx=vx, vy=vy)
 
 
 if __name__ == "__main__":
-    main(get_config().output_dir)
+    config = get_config()
+    main(**vars(config))
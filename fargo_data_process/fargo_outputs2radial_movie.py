@@ -1,11 +1,10 @@
-import argparse
 import os
 
 import matplotlib.animation as ani
 import matplotlib.pyplot as plt
 import numpy as np
 
-from .fargoData import TimeSeqData
+from .config import get_parser, make_output_dir
 
 
 class RadialDistributionEvolution:
@@ -82,6 +81,22 @@ class RadialDistributionEvolution:
         )
 
 
+def get_config(args=None):
+    parser = get_parser()
+    parser.add_argument("--period_of_t_step", type=int, default=1)
+    parser.add_argument("--legend_prec", type=int, default=3)
+    parser.add_argument("--sigma_ymin", type=float)
+    parser.add_argument("--sigma_ymax", type=float)
+    parser.add_argument("--v_r_ymin", type=float)
+    parser.add_argument("--v_r_ymax", type=float)
+    parser.add_argument("--v_theta_ymin", type=float)
+    parser.add_argument("--v_theta_ymax", type=float)
+    parser.add_argument("--r_min", type=float)
+    parser.add_argument("--r_max", type=float)
+
+    return parser.parse_args(args)
+
+
 def main(
     output_dir,
     period_of_t_step,
@@ -94,7 +109,14 @@ def main(
     v_theta_ymax,
     r_min,
     r_max,
+    **options,
 ):
+    output = make_output_dir(output_dir, **options)
+    # the profiles of every frame are computed once and reused from radial_profiles.nc,
+    # only every period_of_t_step-th frame is shown
+    profiles = output.radial_profiles(["gasdens", "gasvx", "gasvy"]).isel(
+        t=slice(None, None, period_of_t_step)
+    )
     _r_min = -np.inf if r_min is None else r_min
     _r_max = np.inf if r_max is None else r_max
     for phys_var_type, y_min, y_max in zip(
@@ -102,12 +124,11 @@ def main(
         [sigma_ymin, v_theta_ymin, v_r_ymin],
         [sigma_ymax, v_theta_ymax, v_r_ymax],
     ):
-        tsdata = TimeSeqData(output_dir, phys_var_type=phys_var_type)
+        profile = profiles["gas" + phys_var_type + "_mean"]
         # get r
-        r = tsdata.y
+        r = profile[profile.dims[1]].values
         # get values
-        value_list = [frame.mean_value_over_x for frame in tsdata.frames]
-        value_list = np.array(value_list[::period_of_t_step])
+        value_list = profile.values
         # filter by r_min and r_max
         selected_index = np.logical_and(r > _r_min, r < _r_max)
         r = r[selected_index]
@@ -115,13 +136,13 @@ def main(
         # ANIMATION.RadialDistributionEvolution require that value_list is a list of (t_num, r_num) array.
         value_list = [value_list]
         # get t
-        t = tsdata.t[::period_of_t_step]
+        t = profile.t.values
         # get ani
         ani = RadialDistributionEvolution(
             r,
             value_list,
             t,
-            title_func=lambda t_: f"{tsdata.phys_var_type}: time={t_ / (2 * np.pi):.{legend_prec}f} orbit",
+            title_func=lambda t_: f"{phys_var_type}: time={t_ / (2 * np.pi):.{legend_prec}f} orbit",
             label_func=lambda _: "FARGO",
             y_min=y_min,
             y_max=y_max,
@@ -131,48 +152,15 @@ def main(
             ani.animation.save(
                 os.path.join(
                     output_dir,
-                    "radial-"
-                    + tsdata.phys_var_type
-                    + "-fargo"
-                    + f"-{r_min}-{r_max}"
-                    + ".mp4",
+                    "radial-" + phys_var_type + "-fargo" + f"-{r_min}-{r_max}" + ".mp4",
                 )
             )
         else:
             ani.animation.save(
-                os.path.join(
-                    output_dir, "radial-" + tsdata.phys_var_type + "-fargo" + ".mp4"
-                )
+                os.path.join(output_dir, "radial-" + phys_var_type + "-fargo" + ".mp4")
             )
 
 
 if __name__ == "__main__":
-    # config
-    parser = argparse.ArgumentParser("main")
-    parser.add_argument("--output_dir", type=str, default="fargo3d/outputs")
-    parser.add_argument("--period_of_t_step", type=int, default=1)
-    parser.add_argument("--legend_prec", type=int, default=3)
-    parser.add_argument("--sigma_ymin", type=float)
-    parser.add_argument("--sigma_ymax", type=float)
-    parser.add_argument("--v_r_ymin", type=float)
-    parser.add_argument("--v_r_ymax", type=float)
-    parser.add_argument("--v_theta_ymin", type=float)
-    parser.add_argument("--v_theta_ymax", type=float)
-    parser.add_argument("--r_min", type=float)
-    parser.add_argument("--r_max", type=float)
-    config = parser.parse_args()
-
-    # run
-    main(
-        output_dir=config.output_dir,
-        period_of_t_step=config.period_of_t_step,
-        legend_prec=config.legend_prec,
-        sigma_ymin=config.sigma_ymin,
-        sigma_ymax=config.sigma_ymax,
-        v_r_ymin=config.v_r_ymin,
-        v_r_ymax=config.v_r_ymax,
-        v_theta_ymin=config.v_theta_ymin,
-        v_theta_ymax=config.v_theta_ymax,
-        r_min=config.r_min,
-        r_max=config.r_max,
-    )
+    config = get_config()
+    main(**vars(config))
@@ -2,28 +2,38 @@ import os
 
 import numpy as np
 
-from .config import get_config
-from .fargoData import TimeSeqData
+from .config import get_config, make_output_dir
 
 
-def main(output_dir):
+def main(output_dir, **options):
     """convert fargo outputs to npz file with (N, 4) shape."""
+    output = make_output_dir(output_dir, **options)
 
-    dens = TimeSeqData(output_dir, phys_var_type="dens")
-    vx = TimeSeqData(output_dir, phys_var_type="vx")
-    vy = TimeSeqData(output_dir, phys_var_type="vy")
+    dens = output.time_seq_data("dens")
+    vx = output.time_seq_data("vx")
+    vy = output.time_seq_data("vy")
     for var, name in zip((dens, vx, vy), ("sigma", "vtheta", "vr")):
-        diff = np.abs(var.values[1:] - var.values[0])
-        diff_max = np.max(diff, axis=(1, 2, 3))
-        diff_mean = np.mean(diff, axis=(1, 2, 3))
+        # stream over frames, only one frame (plus the first one) is held in memory
+        value_0 = None
+        diff_max, diff_mean = [], []
+        for _, values in var.iter_frames():
+            if value_0 is None:
+                value_0 = values[0].copy()
+            diff = np.abs(values - value_0)
+            diff_max.append(np.max(diff, axis=(1, 2)))
+            diff_mean.append(np.mean(diff, axis=(1, 2)))
+        # drop the first frame, which is compared with itself
+        diff_max = np.concatenate(diff_max)[1:]
+        diff_mean = np.concatenate(diff_mean)[1:]
         print("=" * 20)
-        print(f"shape of diff = {diff.shape}")
+        print(f"shape of diff = {(len(diff_mean),) + value_0.shape + (1,)}")
         print(f"{name}: mean of diff = {diff_mean}")
-        print(np.mean(diff))
+        print(np.mean(diff_mean))
         print(f"{name}: max of diff = {diff_max}")
-        print(np.max(diff))
+        print(np.max(diff_max))
         print("=" * 20)
 
 
 if __name__ == "__main__":
-    main(get_config().output_dir)
+    config = get_config()
+    main(**vars(config))
@@ -1,22 +1,199 @@
-from .config import get_config
-from .fargoData import TimeSeqData
+import pathlib
+import time
+
+import yaml
+
+from .config import get_parser, make_output_dir
+from .fargoData import OutputDir, get_frame_index
 from .utils import resolve_save_dir
 
+FIELDS = {"dens": "gasdens", "vx": "gasvx", "vy": "gasvy"}
+MANIFEST = "test_frames.yml"
+
+
+def get_config(args=None):
+    parser = get_parser()
+    parser.add_argument(
+        "--follow",
+        type=int,
+        choices=[0, 1],
+        default=0,
+        help="Poll output_dir and append new frames while the simulation is running.",
+    )
+    parser.add_argument(
+        "--poll_interval", type=float, default=60.0, help="Seconds between polls."
+    )
+    parser.add_argument(
+        "--max_idle",
+        type=float,
+        help="Stop following after this many seconds without new frames.",
+    )
+    parser.add_argument(
+        "--on_bad_frame",
+        type=str,
+        choices=["fail", "skip", "truncate"],
+        default="fail",
+        help="Frames with a missing or incomplete file: fail before reading, skip them, "
+        "or stop at the first one.",
+    )
+    parser.add_argument(
+        "--checksum",
+        type=int,
+        choices=[0, 1],
+        default=0,
+        help="Read every frame and compare its CRC-32 with the one recorded in the output_dir manifest "
+        "by the first --checksum 1 run, frames that differ are bad frames.",
+    )
+
+    config = parser.parse_args(args)
+    if config.follow:
+        # frames are appended as they complete, one at a time
+        unsupported = {
+            "--stride": config.stride != 1,
+            "--frame_indices": config.frame_indices is not None,
+            "--cache": config.cache,
+            "--on_bad_frame": config.on_bad_frame != "fail",
+            "--checksum": config.checksum,
+        }
+        unsupported = [option for option, given in unsupported.items() if given]
+        if unsupported:
+            parser.error(f"{', '.join(unsupported)} not supported with --follow 1")
+    return config
+
 
-def main(output_dir):
+def main(output_dir, on_bad_frame="fail", checksum=False, **options):
     """convert fargo outputs to npz file with (N, 4) shape."""
+    output = make_output_dir(output_dir, **options)
+    # integrity pre-check, from the file sizes only
+    bad_frames = output.check_frames(FIELDS.values(), on_bad_frame, checksum)
+    if bad_frames:
+        print(f"{on_bad_frame}: frames {bad_frames} are missing or incomplete")
     save_dir = resolve_save_dir(output_dir, ["variables.par"])
 
-    dens = TimeSeqData(output_dir, phys_var_type="dens").xarray
+    # the three fields are read through one thread pool
+    dens, vx, vy = output.read(["gasdens", "gasvx", "gasvy"]).values()
     print(f"dens shape {dens.shape}")
-    vx = TimeSeqData(output_dir, phys_var_type="vx").xarray
     print(f"vx shape {vx.shape}")
-    vy = TimeSeqData(output_dir, phys_var_type="vy").xarray
     print(f"vy shape {vy.shape}")
     dens.to_netcdf(save_dir / "test_dens.nc", engine="scipy")
     vx.to_netcdf(save_dir / "test_vx.nc", engine="scipy")
     vy.to_netcdf(save_dir / "test_vy.nc", engine="scipy")
+    # the files are rewritten with a fixed t dimension, a later follow session starts over
+    (save_dir / MANIFEST).unlink(missing_ok=True)
+
+
+def appendable(save_dir: pathlib.Path, n_frames: int) -> bool:
+    """whether ``test_{dens,vx,vy}.nc`` have an unlimited ``t`` dimension holding at least ``n_frames`` frames"""
+    import netCDF4
+
+    for phys_var_type in FIELDS:
+        data_file = save_dir / f"test_{phys_var_type}.nc"
+        if not data_file.exists():
+            return False
+        with netCDF4.Dataset(data_file, "r") as dataset:
+            t = dataset.dimensions.get("t")
+            if t is None or not t.isunlimited() or len(t) < n_frames:
+                return False
+    return True
+
+
+def append_new_frames(output: OutputDir, save_dir: pathlib.Path) -> int:
+    """Append the frames completed since the last call to ``test_{dens,vx,vy}.nc``.
+
+    The netCDF files have an unlimited ``t`` dimension. Ingested frame indices are recorded in
+    ``test_frames.yml``, which is written last, so an interrupted append is redone at the same
+    position on the next call. The files are written again from the first frame when they do not
+    match the manifest, see ``appendable``.
+
+    Args:
+        output: the outputs directory, its ``t_min``/``t_max``/``dtype`` are honoured.
+        save_dir: directory of the netCDF files.
+
+    Returns:
+        number of appended frames.
+    """
+    import netCDF4
+
+    manifest_file = save_dir / MANIFEST
+    if manifest_file.exists():
+        with manifest_file.open("r") as f:
+            ingested = yaml.safe_load(f)["frame_index"]
+    else:
+        ingested = []
+    if ingested and not appendable(save_dir, len(ingested)):
+        # e.g. the files were rewritten by ``main``, ingest every frame again
+        print(f"{MANIFEST} does not match the netCDF files, ingesting from the start")
+        ingested = []
+
+    output.rescan()
+    output.frame_indices = [
+        i
+        for i in output.complete_frame_indices(FIELDS.values())
+        if not ingested or i > ingested[-1]
+    ]
+    new_frames = [get_frame_index(file) for file in output.file_list("gasdens")]
+    if not new_frames:
+        return 0
+    arrays = output.read(FIELDS.values())
+
+    for phys_var_type, field in FIELDS.items():
+        array = arrays[field]
+        data_file = save_dir / f"test_{phys_var_type}.nc"
+        if not ingested:
+            array.to_netcdf(data_file, engine="netcdf4", unlimited_dims=["t"])
+            continue
+        with netCDF4.Dataset(data_file, "a") as dataset:
+            (variable,) = [
+                v
+                for v in dataset.variables.values()
+                if v.dimensions == ("t", "r", "theta")
+            ]
+            # write at the position given by the manifest, not the file length
+            start = len(ingested)
+            dataset["t"][start : start + len(new_frames)] = array.t.values
+            variable[start : start + len(new_frames)] = array.values
+
+    with manifest_file.open("w") as f:
+        yaml.safe_dump({"frame_index": ingested + new_frames}, f)
+    return len(new_frames)
+
+
+def follow(output_dir, poll_interval=60.0, max_idle=None, **options):
+    """Append new frames to ``test_{dens,vx,vy}.nc`` while the simulation is running.
+
+    Args:
+        output_dir: the directory path of the FARGO3D outputs.
+        poll_interval: seconds between two scans of output_dir.
+        max_idle: stop after this many seconds without new frames, never stop if None.
+        **options: see ``make_output_dir``, ``stride`` and ``frame_indices`` are not supported.
+    """
+    if options.get("stride", 1) != 1:
+        raise ValueError("stride is not supported with --follow.")
+    if options.get("frame_indices") is not None:
+        raise ValueError("frame_indices is not supported with --follow.")
+    output = make_output_dir(output_dir, **options)
+    save_dir = resolve_save_dir(output_dir, ["variables.par"])
+
+    last_update = time.monotonic()
+    while True:
+        n_new = append_new_frames(output, save_dir)
+        if n_new > 0:
+            last_update = time.monotonic()
+            print(f"appended {n_new} frames")
+        elif max_idle is not None and time.monotonic() - last_update > max_idle:
+            break
+        time.sleep(poll_interval)
 
 
 if __name__ == "__main__":
-    main(get_config().output_dir)
+    options = vars(get_config())
+    follow_options = {
+        key: options.pop(key) for key in ["follow", "poll_interval", "max_idle"]
+    }
+    if follow_options.pop("follow"):
+        # left at their defaults, see get_config
+        for key in ["cache", "on_bad_frame", "checksum"]:
+            del options[key]
+        follow(**options, **follow_options)
+    else:
+        main(**options)
@@ -11,16 +11,15 @@ R_UNIT = 100  # AU
 
 
 def rotate_iteratively(
-    dataarray: xr.DataArray, run_ids: typing.Iterable, planet_angles: typing.Iterable
+    dataarray: xr.DataArray,
+    run_ids: typing.Iterable,
+    planet_angles: typing.Iterable,
+    method: str = "linear",
 ) -> xr.DataArray:
-    rotated_data_list = []
-    for run_id, planet_angle in zip(run_ids, planet_angles):
-        rotated_data = fargo_data_process.utils.rotate_dataarray(
-            dataarray.sel(run=run_id), planet_angle
-        )
-        rotated_data_list.append(rotated_data)
-    rotated_data = xr.concat(rotated_data_list, dim="run")
-    return rotated_data
+    # all runs are rotated at once, see fargo_data_process.utils.rotate_runs
+    return fargo_data_process.utils.rotate_dataarray_runs(
+        dataarray.sel(run=list(run_ids)), planet_angles, method=method
+    )
 
 
 def main():
@@ -31,6 +30,13 @@ def main():
     parser.add_argument("--r_p_min", type=float, default=50, help="in AU")
     parser.add_argument("--r_p_max", type=float, default=150, help="in AU")
     parser.add_argument("--num_images", type=int, default=256)
+    parser.add_argument(
+        "--rotation",
+        type=str,
+        choices=["linear", "spectral"],
+        default="linear",
+        help="Linear interpolation along theta, or exact Fourier phase shift.",
+    )
     args = parser.parse_args()
 
     data_dir = fargo_data_process.utils.match_run_dir(
@@ -58,7 +64,10 @@ def main():
         data = data.assign_coords(r_p=("run", r_p), theta_p=("run", theta_p))
         # rotate by theta_p
         data = rotate_iteratively(
-            data, run_ids=data["run"].values, planet_angles=data["theta_p"].values
+            data,
+            run_ids=data["run"].values,
+            planet_angles=data["theta_p"].values,
+            method=args.rotation,
         )
         # correct azimuthal velocity from rotating frame to inertial frame
         if file == "batch_truth_v_theta.nc":
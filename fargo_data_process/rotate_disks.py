@@ -10,16 +10,15 @@ import fargo_data_process.utils
 
 
 def rotate_iteratively(
-    dataarray: xr.DataArray, run_ids: typing.Iterable, planet_angles: typing.Iterable
+    dataarray: xr.DataArray,
+    run_ids: typing.Iterable,
+    planet_angles: typing.Iterable,
+    method: str = "linear",
 ) -> xr.DataArray:
-    rotated_data_list = []
-    for run_id, planet_angle in zip(run_ids, planet_angles):
-        rotated_data = fargo_data_process.utils.rotate_dataarray(
-            dataarray.sel(run=run_id), planet_angle
-        )
-        rotated_data_list.append(rotated_data)
-    rotated_data = xr.concat(rotated_data_list, dim="run")
-    return rotated_data
+    # all runs are rotated at once, see fargo_data_process.utils.rotate_runs
+    return fargo_data_process.utils.rotate_dataarray_runs(
+        dataarray.sel(run=list(run_ids)), planet_angles, method=method
+    )
 
 
 def main():
@@ -28,6 +27,13 @@ def main():
     parser.add_argument("--dataset_id", type=str)
     parser.add_argument("--save_dir", type=str)
     parser.add_argument("--planet_angle_file", type=str, default="planet_angles.csv")
+    parser.add_argument(
+        "--rotation",
+        type=str,
+        choices=["linear", "spectral"],
+        default="linear",
+        help="Linear interpolation along theta, or exact Fourier phase shift.",
+    )
     args = parser.parse_args()
 
     data_dir = fargo_data_process.utils.match_run_dir(
@@ -51,7 +57,10 @@ def main():
             raise FileExistsError(f"{save_dir / file} exists.")
         data = xr.open_dataarray(data_dir / file)
         rotated_data = rotate_iteratively(
-            data, run_ids=run_ids, planet_angles=planet_angles
+            data,
+            run_ids=run_ids,
+            planet_angles=planet_angles,
+            method=args.rotation,
         )
         # save
         rotated_data.to_netcdf(save_dir / file)
@@ -1,8 +1,13 @@
+import functools
+import hashlib
+import os
 import pathlib
 from typing import Union
 
 import numpy as np
+import scipy.fft
 import scipy.interpolate as si
+import scipy.sparse
 import xarray as xr
 
 
@@ -30,11 +35,282 @@ def resolve_save_dir(output_dir, file_list, verbose=True):
     return save_dir
 
 
-def xarray_polar_to_cartesian(data_array: xr.DataArray, x, y):
+def run_seed_sequence(seed: int, run_id) -> np.random.SeedSequence:
+    """Random stream of one run, keyed by its run id.
+
+    The child that ``np.random.SeedSequence(seed).spawn`` would give at the position hashed from the run id,
+    so the stream of a run does not depend on the other runs, their order, or which process draws it.
+
+    Args:
+        seed: the seed of the whole dataset.
+        run_id: id of the run, e.g. the ``run`` coordinate value.
+
+    Returns:
+        seed sequence, pass it to ``np.random.default_rng``.
+    """
+    digest = hashlib.sha1(str(run_id).encode()).digest()
+    return np.random.SeedSequence(
+        seed, spawn_key=(int.from_bytes(digest[:8], "little"),)
+    )
+
+
+def run_seed_sequences(seed: int, run_ids) -> list:
+    """``run_seed_sequence`` of every run id"""
+    return [run_seed_sequence(seed, run_id) for run_id in run_ids]
+
+
+class InterpolationOperator:
+    """Linear interpolation from a rectilinear grid to a set of points, as a sparse (CSR) matrix.
+
+    ``operator(values)`` gives the same result as ``DataArray.interp`` with the default linear method,
+    NaN outside of the grid, and also NaN next to a NaN cell since the 4 neighbours are always stored,
+    including those with a zero weight.
+    """
+
+    def __init__(self, matrix: scipy.sparse.csr_matrix, outside: np.ndarray):
+        """
+
+        Args:
+            matrix: (n_points, n_grid) sparse matrix, the grid is flattened in C order.
+            outside: (n_points,) boolean array, True for the points outside of the grid.
+        """
+        self.matrix = matrix
+        self.outside = outside
+
+    @classmethod
+    def from_grid(cls, grid0, grid1, points0, points1):
+        """
+
+        Args:
+            grid0: (n0,) ascending coordinates of the outer axis of the grid.
+            grid1: (n1,) ascending coordinates of the inner axis of the grid.
+            points0: (n_points,) coordinates of the points along the outer axis.
+            points1: (n_points,) coordinates of the points along the inner axis.
+        """
+        indices, weights = [], []
+        outside = np.zeros(len(points0), dtype=bool)
+        for grid, points in [(grid0, points0), (grid1, points1)]:
+            i = np.clip(np.searchsorted(grid, points) - 1, 0, len(grid) - 2)
+            w = (points - grid[i]) / (grid[i + 1] - grid[i])
+            outside |= (points < grid[0]) | (points > grid[-1]) | np.isnan(points)
+            indices.append(i)
+            weights.append(w)
+        (i0, i1), (w0, w1) = indices, weights
+        n1 = len(grid1)
+        columns = np.stack(
+            [
+                i0 * n1 + i1,
+                i0 * n1 + i1 + 1,
+                (i0 + 1) * n1 + i1,
+                (i0 + 1) * n1 + i1 + 1,
+            ],
+            axis=1,
+        )
+        data = np.stack(
+            [(1 - w0) * (1 - w1), (1 - w0) * w1, w0 * (1 - w1), w0 * w1], axis=1
+        )
+        data[outside] = 0.0
+        matrix = scipy.sparse.csr_matrix(
+            (
+                data.ravel(),
+                np.where(outside[:, None], 0, columns).ravel(),
+                np.arange(0, 4 * len(points0) + 1, 4),
+            ),
+            shape=(len(points0), len(grid0) * n1),
+        )
+        return cls(matrix, outside)
+
+    def __call__(self, values: np.ndarray) -> np.ndarray:
+        """
+
+        Args:
+            values: (..., n0, n1) values on the grid, e.g. (run, r, theta).
+
+        Returns:
+            (..., n_points), float64. The leading axes are stacked into one sparse mat-mat product.
+        """
+        shape = values.shape[:-2]
+        values = values.reshape((-1, self.matrix.shape[1]))
+        result = np.asarray(self.matrix @ values.T, dtype=float).T
+        result[:, self.outside] = np.nan
+        return result.reshape(shape + (self.matrix.shape[0],))
+
+    def save(self, file):
+        np.savez(
+            file,
+            data=self.matrix.data,
+            indices=self.matrix.indices,
+            indptr=self.matrix.indptr,
+            shape=self.matrix.shape,
+            outside=self.outside,
+        )
+
+    @classmethod
+    def load(cls, file):
+        with np.load(file) as f:
+            matrix = scipy.sparse.csr_matrix(
+                (f["data"], f["indices"], f["indptr"]), shape=tuple(f["shape"])
+            )
+            return cls(matrix, f["outside"])
+
+
+def cell_edges(centers) -> np.ndarray:
+    """Edges of the cells around ascending cell centers, the outer edges are extrapolated by half a cell."""
+    centers = np.asarray(centers, dtype=float)
+    edges = (centers[1:] + centers[:-1]) / 2
+    return np.concatenate(
+        [[2 * centers[0] - edges[0]], edges, [2 * centers[-1] - edges[-1]]]
+    )
+
+
+def polar_cartesian_overlap(r, theta, x, y, oversample: int = 8):
+    """Overlap area between the cells of a polar grid and the pixels of a cartesian grid.
+
+    Each polar cell is split into annular sub-sectors no larger than 1 / ``oversample`` of a pixel,
+    the area of a sub-sector is exact and goes to the pixel that contains its center.
+
+    Args:
+        r: (nr,) ascending cell centers along r.
+        theta: (ntheta,) ascending cell centers along theta.
+        x: (nx,) ascending pixel centers along x.
+        y: (ny,) ascending pixel centers along y.
+        oversample: number of sub-sectors per pixel size.
+
+    Returns:
+        (ny * nx, nr * ntheta) CSR matrix, pixels are flattened with y outer, cells with r outer.
+    """
+    r_edges, theta_edges = cell_edges(r), cell_edges(theta)
+    x_edges, y_edges = cell_edges(x), cell_edges(y)
+    pixel_size = min(np.min(np.diff(x_edges)), np.min(np.diff(y_edges)))
+    d_theta = np.diff(theta_edges)
+
+    rows, columns, areas = [], [], []
+    for i in range(len(r)):
+        r0, r1 = r_edges[i], r_edges[i + 1]
+        n_r = int(np.ceil((r1 - r0) / pixel_size * oversample))
+        n_theta = int(np.ceil(r1 * np.max(d_theta) / pixel_size * oversample))
+        # sub-sector edges and centers, (n_r + 1,) and (ntheta, n_theta + 1)
+        sub_r = np.linspace(r0, r1, n_r + 1)
+        sub_theta = theta_edges[:-1, None] + d_theta[:, None] * np.linspace(
+            0, 1, n_theta + 1
+        )
+        r_c = (sub_r[1:] + sub_r[:-1]) / 2
+        theta_c = (sub_theta[:, 1:] + sub_theta[:, :-1]) / 2
+        # (n_r, ntheta, n_theta)
+        area = (
+            0.5
+            * (sub_r[1:] ** 2 - sub_r[:-1] ** 2)[:, None, None]
+            * np.diff(sub_theta, axis=1)[None]
+        )
+        x_c = r_c[:, None, None] * np.cos(theta_c)[None]
+        y_c = r_c[:, None, None] * np.sin(theta_c)[None]
+        column = np.broadcast_to(
+            i * len(theta) + np.arange(len(theta))[:, None], area.shape
+        )
+
+        ix = np.searchsorted(x_edges, x_c.ravel()) - 1
+        iy = np.searchsorted(y_edges, y_c.ravel()) - 1
+        inside = (ix >= 0) & (ix < len(x)) & (iy >= 0) & (iy < len(y))
+        rows.append((iy * len(x) + ix)[inside])
+        columns.append(column.ravel()[inside])
+        areas.append(area.ravel()[inside])
+
+    # duplicated (pixel, cell) pairs are summed
+    return scipy.sparse.csr_matrix(
+        (np.concatenate(areas), (np.concatenate(rows), np.concatenate(columns))),
+        shape=(len(y) * len(x), len(r) * len(theta)),
+    )
+
+
+_interpolation_operators = {}
+
+
+def _cached_operator(name, arrays, build, cache_dir=None) -> InterpolationOperator:
+    """operator built by ``build()``, cached in memory by name and arrays, and in ``cache_dir`` if given"""
+    digest = hashlib.sha1(name.encode())
+    for a in arrays:
+        digest.update(str(a.shape).encode())
+        digest.update(a.tobytes())
+    key = digest.hexdigest()
+    if key in _interpolation_operators:
+        return _interpolation_operators[key]
+
+    file = None if cache_dir is None else pathlib.Path(cache_dir) / f"{key}.npz"
+    if file is not None and file.exists():
+        operator = InterpolationOperator.load(file)
+    else:
+        operator = build()
+        if file is not None:
+            file.parent.mkdir(parents=True, exist_ok=True)
+            # write to a temporary file first, readers never see a partial operator
+            with open(file.with_suffix(".tmp"), "wb") as f:
+                operator.save(f)
+            os.replace(file.with_suffix(".tmp"), file)
+    _interpolation_operators[key] = operator
+    return operator
+
+
+def get_interpolation_operator(
+    grid0, grid1, points0, points1, cache_dir=None
+) -> InterpolationOperator:
+    """``InterpolationOperator.from_grid``, cached in memory by grid and points, and in ``cache_dir`` if given.
+
+    Args:
+        grid0, grid1, points0, points1: see ``InterpolationOperator.from_grid``.
+        cache_dir: directory of the operators saved on disk, not saved if None.
+    """
+    arrays = [
+        np.ascontiguousarray(a, dtype=float) for a in [grid0, grid1, points0, points1]
+    ]
+    return _cached_operator(
+        "linear", arrays, lambda: InterpolationOperator.from_grid(*arrays), cache_dir
+    )
+
+
+def get_conservative_operator(
+    r, theta, x, y, to_cartesian: bool, oversample: int = 8, cache_dir=None
+) -> InterpolationOperator:
+    """Conservative (area-weighted) remapping between a polar and a cartesian grid, see ``polar_cartesian_overlap``.
+
+    The value of a target cell is the mean of the source cells weighted by their overlap area, so the
+    integral over the covered area is kept. Target cells without any overlap are NaN. The overlap matrix
+    is cached like ``get_interpolation_operator``.
+
+    Args:
+        r, theta, x, y: see ``polar_cartesian_overlap``.
+        to_cartesian: True from (r, theta) to (y, x), False from (y, x) to (r, theta).
+        oversample: see ``polar_cartesian_overlap``.
+        cache_dir: directory of the operators saved on disk, not saved if None.
+    """
+    arrays = [np.ascontiguousarray(a, dtype=float) for a in [r, theta, x, y]]
+
+    def build():
+        overlap = polar_cartesian_overlap(*arrays, oversample=oversample)
+        if not to_cartesian:
+            overlap = overlap.T.tocsr()
+        covered = np.asarray(overlap.sum(axis=1)).ravel()
+        outside = covered == 0
+        matrix = (
+            scipy.sparse.diags(
+                np.where(outside, 0.0, 1 / np.where(outside, 1, covered))
+            )
+            @ overlap
+        )
+        return InterpolationOperator(matrix.tocsr(), outside)
+
+    name = f"conservative-{'p2c' if to_cartesian else 'c2p'}-{oversample}"
+    return _cached_operator(name, arrays, build, cache_dir)
+
+
+def xarray_polar_to_cartesian(
+    data_array: xr.DataArray, x, y, cache_dir=None, method="linear", oversample=8
+):
     x = np.array(x)
     y = np.array(y)
     if x.ndim != 1 or y.ndim != 1:
         raise ValueError("x and y must be 1D array.")
+    if method not in ["linear", "conservative"]:
+        raise ValueError(f"{method}, expect 'linear' or 'conservative'.")
 
     # y is outer axis, x is inner axis
     xgrid, ygrid = np.meshgrid(x, y, indexing="xy")
@@ -45,7 +321,25 @@ def xarray_polar_to_cartesian(data_array: xr.DataArray, x, y):
     coords = {k: data_array[k] for k in set(data_array.coords) - {"r", "theta"}}
     coords.update({"y": ("y", y), "x": ("x", x)})
 
-    data_array = data_array.interp({"r": r, "theta": theta}).values
+    if method == "conservative":
+        operator = get_conservative_operator(
+            data_array.r.values,
+            data_array.theta.values,
+            x,
+            y,
+            to_cartesian=True,
+            oversample=oversample,
+            cache_dir=cache_dir,
+        )
+    else:
+        operator = get_interpolation_operator(
+            data_array.r.values,
+            data_array.theta.values,
+            r.values,
+            theta.values,
+            cache_dir,
+        )
+    data_array = operator(data_array.transpose(..., "r", "theta").values)
 
     if data_array.ndim == 2:
         data_array = xr.DataArray(
@@ -63,11 +357,15 @@ def xarray_polar_to_cartesian(data_array: xr.DataArray, x, y):
     return data_array
 
 
-def xarray_cartesian_to_polar(data_array: xr.DataArray, r, theta):
+def xarray_cartesian_to_polar(
+    data_array: xr.DataArray, r, theta, cache_dir=None, method="linear", oversample=8
+):
     r = np.array(r)
     theta = np.array(theta)
     if r.ndim != 1 or theta.ndim != 1:
         raise ValueError("r and theta must be 1D array.")
+    if method not in ["linear", "conservative"]:
+        raise ValueError(f"{method}, expect 'linear' or 'conservative'.")
 
     # theta is outer axis, r is inner axis
     rgrid, thetagrid = np.meshgrid(r, theta, indexing="ij")
@@ -78,7 +376,21 @@ def xarray_cartesian_to_polar(data_array: xr.DataArray, r, theta):
     coords = {k: data_array[k] for k in set(data_array.coords) - {"x", "y"}}
     coords.update({"r": ("r", r), "theta": ("theta", theta)})
 
-    data_array = data_array.interp({"x": x, "y": y}).values
+    if method == "conservative":
+        operator = get_conservative_operator(
+            r,
+            theta,
+            data_array.x.values,
+            data_array.y.values,
+            to_cartesian=False,
+            oversample=oversample,
+            cache_dir=cache_dir,
+        )
+    else:
+        operator = get_interpolation_operator(
+            data_array.y.values, data_array.x.values, y.values, x.values, cache_dir
+        )
+    data_array = operator(data_array.transpose(..., "y", "x").values)
 
     if data_array.ndim == 2:
         data_array = xr.DataArray(
@@ -155,3 +467,178 @@ def rotate_dataarray(data_array, delta):
         values, dims=data_array.dims, coords=data_array.coords, attrs=data_array.attrs
     )
     return values
+
+
+def rotate_runs(
+    values: np.ndarray, theta, deltas, method: str = "linear"
+) -> np.ndarray:
+    """Rotate every run by its own angle along the last (theta) axis, all runs in one call.
+
+    the rotated value at theta is the value at theta - delta of the input, periodic in 2 pi, the same as
+    ``rotate_dataarray``. theta can be any ascending grid covering one period, e.g. the staggered
+    (cell edge) theta of vx, the rotation only uses the actual theta values.
+
+    Args:
+        values: (run, ..., theta) array.
+        theta: (ntheta,) ascending azimuthal coordinates in [-pi, pi).
+        deltas: (run,) rotation angles in radians.
+        method: "linear" interpolates linearly between the two neighbours, as ``rotate_dataarray``.
+            "spectral" shifts the phase of the Fourier modes along theta, exact for band-limited data,
+            requires a uniform theta grid.
+
+    Returns:
+        rotated values, same shape as values.
+    """
+    theta = np.asarray(theta, dtype=float)
+    deltas = np.asarray(deltas, dtype=float)
+    n_theta = len(theta)
+    if deltas.shape != values.shape[:1]:
+        raise ValueError(
+            f"expect one angle per run, got {deltas.shape} for {values.shape}."
+        )
+    # per-run angles, broadcast over the axes between run and theta
+    deltas = deltas.reshape((-1,) + (1,) * (values.ndim - 1))
+
+    if method == "spectral":
+        d_theta = np.diff(theta)
+        if not np.allclose(d_theta, 2 * np.pi / n_theta):
+            raise ValueError(
+                "spectral rotation requires a uniform theta grid over 2 pi."
+            )
+        # v(theta - delta) multiplies the k-th mode by exp(-i k delta)
+        k = np.fft.rfftfreq(n_theta, d=1.0 / n_theta)
+        spectrum = np.fft.rfft(values, axis=-1) * np.exp(-1j * k * deltas)
+        return np.fft.irfft(spectrum, n=n_theta, axis=-1)
+    elif method == "linear":
+        # the grid padded by one period on both sides, so that every query has two neighbours
+        theta_padded = np.concatenate(
+            [theta[-1:] - 2 * np.pi, theta, theta[:1] + 2 * np.pi]
+        )
+        values = np.concatenate((values[..., -1:], values, values[..., :1]), axis=-1)
+        query = np.mod(theta - deltas + np.pi, 2 * np.pi) - np.pi
+        i = np.clip(np.searchsorted(theta_padded, query) - 1, 0, n_theta)
+        weight = (query - theta_padded[i]) / (theta_padded[i + 1] - theta_padded[i])
+        i = np.broadcast_to(i, values.shape[:-1] + (n_theta,))
+        weight = np.broadcast_to(weight, i.shape)
+        return (1 - weight) * np.take_along_axis(values, i, axis=-1) + (
+            weight * np.take_along_axis(values, i + 1, axis=-1)
+        )
+    else:
+        raise ValueError(f"{method}, expect 'linear' or 'spectral'.")
+
+
+def rotate_dataarray_runs(data_array, deltas, method: str = "linear"):
+    """Rotate every run of a DataArray by its own angle, see ``rotate_runs``.
+
+    The batched counterpart of calling ``rotate_dataarray`` run by run and concatenating the results.
+
+    Args:
+        data_array (xr.DataArray): DataArray with the dimensions ``run`` and ``theta``.
+        deltas: (run,) rotation angles in radians (-pi to pi), in the order of ``data_array.run``.
+        method: see ``rotate_runs``.
+
+    Returns:
+        xr.DataArray: Rotated DataArray, theta is sorted.
+    """
+    if "theta" not in data_array.dims or "run" not in data_array.dims:
+        raise ValueError("Input data_array must have 'run' and 'theta' dimensions.")
+    deltas = np.asarray(deltas, dtype=float)
+    if np.any(np.abs(deltas) > np.pi):
+        raise ValueError("Rotation angle 'delta' must be in the range [-pi, pi].")
+
+    dims = data_array.dims
+    data_array = data_array.sortby("theta").transpose("run", ..., "theta")
+    values = rotate_runs(data_array.values, data_array.theta.values, deltas, method)
+    values = xr.DataArray(
+        values, dims=data_array.dims, coords=data_array.coords, attrs=data_array.attrs
+    )
+    return values.transpose(*dims)
+
+
+@functools.lru_cache(maxsize=64)
+def gaussian_kernel(beam_size: float) -> np.ndarray:
+    """The normalized ``astropy.convolution.Gaussian2DKernel(beam_size)`` array, built with NumPy.
+
+    The Gaussian is sampled at the pixel centres of a square of the smallest odd size >= 8 * beam_size.
+
+    Args:
+        beam_size: standard deviation of the beam in pixel.
+
+    Returns:
+        (n, n) array that sums to 1.
+    """
+    size = int(np.ceil(8 * beam_size))
+    size += 1 - size % 2
+    x = np.arange(size) - size // 2
+    kernel = np.exp(-(x[:, None] ** 2 + x[None, :] ** 2) / (2 * beam_size**2))
+    return kernel / kernel.sum()
+
+
+def _beam_transfer_function(beam_size: float, image_shape: tuple, fft_shape: tuple):
+    """rfft2 of ``gaussian_kernel``, centred on the origin of an ``fft_shape`` grid"""
+    kernel = gaussian_kernel(beam_size)
+    # taps further than the image size never meet the image
+    half = [min(n // 2, m - 1) for n, m in zip(kernel.shape, image_shape)]
+    kernel = kernel[
+        kernel.shape[0] // 2 - half[0] : kernel.shape[0] // 2 + half[0] + 1,
+        kernel.shape[1] // 2 - half[1] : kernel.shape[1] // 2 + half[1] + 1,
+    ]
+    padded = np.zeros(fft_shape)
+    iy = np.arange(-half[0], half[0] + 1) % fft_shape[0]
+    ix = np.arange(-half[1], half[1] + 1) % fft_shape[1]
+    padded[np.ix_(iy, ix)] = kernel
+    return scipy.fft.rfft2(padded)
+
+
+def convolve_gaussian_beam(
+    maps: np.ndarray, beam_sizes, batch_size: int = 16, workers: int = -1
+) -> np.ndarray:
+    """Convolve 2D maps with Gaussian beams in batched FFTs.
+
+    The same as ``astropy.convolution.convolve(map, Gaussian2DKernel(beam_size))`` map by map, with the
+    default zero-filled boundary: the maps are zero padded so that the FFT does not wrap around.
+    The transfer function of each beam size is computed once and cached.
+
+    Args:
+        maps: (..., ny, nx) array.
+        beam_sizes: standard deviation of the beam in pixel, a scalar or one per map (...).
+        batch_size: number of maps transformed together, bounds the memory of the spectra.
+        workers: passed to ``scipy.fft``.
+
+    Returns:
+        convolved maps, same shape as maps.
+    """
+    maps = np.asarray(maps, dtype=float)
+    shape, image_shape = maps.shape, maps.shape[-2:]
+    beam_sizes = np.broadcast_to(np.asarray(beam_sizes, dtype=float), shape[:-2])
+    maps = maps.reshape((-1,) + image_shape)
+    beam_sizes = beam_sizes.reshape(-1)
+
+    # padding by the largest kernel radius avoids the wrap around
+    kernel_shape = gaussian_kernel(beam_sizes.max()).shape
+    fft_shape = tuple(
+        scipy.fft.next_fast_len(m + min(n // 2, m - 1), real=True)
+        for n, m in zip(kernel_shape, image_shape)
+    )
+    convolved = np.empty_like(maps)
+    for start in range(0, len(maps), batch_size):
+        stop = min(start + batch_size, len(maps))
+        transfer = [
+            _beam_transfer_function(float(beam_size), image_shape, fft_shape)
+            for beam_size in np.unique(beam_sizes[start:stop])
+        ]
+        if len(transfer) == 1:
+            transfer = transfer[0]
+        else:
+            transfer = np.stack(
+                [
+                    _beam_transfer_function(float(beam_size), image_shape, fft_shape)
+                    for beam_size in beam_sizes[start:stop]
+                ]
+            )
+        spectrum = scipy.fft.rfft2(maps[start:stop], s=fft_shape, workers=workers)
+        spectrum *= transfer
+        convolved[start:stop] = scipy.fft.irfft2(
+            spectrum, s=fft_shape, workers=workers
+        )[..., : image_shape[0], : image_shape[1]]
+    return convolved.reshape(shape)
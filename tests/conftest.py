@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def synthetic_output_dir(tmp_path):
+    """A small FARGO3D-like outputs directory, NX=16, NY=8, 5 frames."""
+    nx, ny, nt = 16, 8, 5
+    setup = {
+        "NX": nx,
+        "NY": ny,
+        "XMIN": -np.pi,
+        "XMAX": np.pi,
+        "YMIN": 0.4,
+        "YMAX": 2.5,
+        "NINTERM": 2,
+        "DT": 0.0314159265359,
+    }
+    with open(tmp_path / "variables.par", "w") as f:
+        for key, value in setup.items():
+            f.write(f"{key}\t{value}\n")
+    np.savetxt(tmp_path / "domain_x.dat", np.linspace(-np.pi, np.pi, nx + 1))
+    dy = (2.5 - 0.4) / ny
+    np.savetxt(tmp_path / "domain_y.dat", 0.4 + dy * np.arange(-3, ny + 4))
+    rng = np.random.default_rng(0)
+    for i in range(nt):
+        for field in ["gasdens", "gasvx", "gasvy"]:
+            (rng.random((ny, nx)) + i).tofile(tmp_path / f"{field}{i}.dat")
+    return str(tmp_path)
@@ -0,0 +1,28 @@
+import numpy as np
+
+import fargo_data_process.add_beam_noise_disks
+import fargo_data_process.utils
+
+
+def test_generate_beam_noise():
+    runs = ["a", "b", "c"]
+    beam_sizes = np.array([2.0, 3.0, 2.0])
+    seeds = fargo_data_process.utils.run_seed_sequences(0, runs)
+    noise = fargo_data_process.add_beam_noise_disks.generate_beam_noise(
+        32, 0.1, beam_sizes, seeds
+    )
+    # run by run, in reverse order
+    reference = [
+        fargo_data_process.add_beam_noise_disks.generate_beam_noise(
+            32, 0.1, beam_size, seed
+        )
+        for beam_size, seed in zip(beam_sizes[::-1], seeds[::-1])
+    ][::-1]
+
+    cri = [
+        noise.shape == (3, 32, 32),
+        np.allclose(noise, np.stack(reference)),
+        np.allclose(noise.std(axis=(1, 2)), 0.1),
+        not np.allclose(noise[0], noise[2]),
+    ]
+    assert all(cri)
@@ -0,0 +1,103 @@
+import astropy.convolution
+import numpy as np
+import pytest
+
+import fargo_data_process.add_v_los_noise
+
+
+def test_fit_noisy_velocity_centers():
+    rng = np.random.default_rng(0)
+    vgrid = np.linspace(-2, 2, 200)
+    line_width = 0.1
+    velocities = rng.uniform(-1.5, 1.5, 300)
+    velocities[[3, 100]] = np.nan
+    noise = 0.1 * rng.standard_normal((len(velocities), len(vgrid)))
+
+    centers = fargo_data_process.add_v_los_noise.fit_noisy_velocity_centers(
+        velocities, noise, vgrid, line_width, chunk_size=128
+    )
+    reference = np.array(
+        [
+            fargo_data_process.add_v_los_noise.fit_noisy_velocity_center(
+                v, n, vgrid, line_width
+            )
+            for v, n in zip(velocities, noise)
+        ]
+    )
+
+    cri = [
+        np.array_equal(np.isnan(centers), np.isnan(velocities)),
+        np.allclose(centers, reference, atol=1e-4, equal_nan=True),
+    ]
+    assert all(cri)
+
+
+@pytest.mark.parametrize("fitter", ["batched", "curve_fit"])
+def test_noisy_velocity_map(fitter):
+    velocity_map = np.linspace(-1, 1, 64).reshape((8, 8))
+    velocity_map[0, 0] = np.nan
+    noisy_map = fargo_data_process.add_v_los_noise.noisy_velocity_map(
+        velocity_map, 1.5, np.linspace(-2, 2, 100), 0.1, 0.05, seed=1, fitter=fitter
+    )
+
+    cri = [
+        noisy_map.shape == velocity_map.shape,
+        np.isnan(noisy_map[0, 0]),
+        np.allclose(noisy_map[1:], velocity_map[1:], atol=0.05),
+    ]
+    assert all(cri)
+
+
+def test_compute_cube_noise_map():
+    noise = fargo_data_process.add_v_los_noise.compute_cube_noise_map(
+        3.0, 4, 32, 0.1, seed=2
+    )
+    # one white noise map per channel, convolved with the beam one by one
+    rng = np.random.default_rng(2)
+    kernel = astropy.convolution.Gaussian2DKernel(3.0)
+    reference = [
+        astropy.convolution.convolve(rng.standard_normal((32, 32)), kernel)
+        for _ in range(4)
+    ]
+    reference = [r / np.std(r) * 0.1 for r in reference]
+
+    cri = [
+        noise.shape == (4, 32, 32),
+        np.allclose(noise, np.stack(reference)),
+        np.array_equal(
+            noise,
+            fargo_data_process.add_v_los_noise.compute_cube_noise_map(
+                3.0, 4, 32, 0.1, seed=2
+            ),
+        ),
+    ]
+    assert all(cri)
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_streaming_noisy_velocity_map(n_jobs, tmp_path):
+    velocity_map = np.linspace(-1, 1, 256).reshape((16, 16))
+    velocity_map[3, 5] = np.nan
+    vgrid = np.linspace(-2, 2, 50)
+    noisy_map = fargo_data_process.add_v_los_noise.noisy_velocity_map(
+        velocity_map, 2.0, vgrid, 0.1, 0.05, seed=3
+    )
+    # a few channels and pixels at a time
+    streamed = fargo_data_process.add_v_los_noise.streaming_noisy_velocity_map(
+        velocity_map,
+        2.0,
+        vgrid,
+        0.1,
+        0.05,
+        seed=3,
+        memory_budget=2e5,
+        n_jobs=n_jobs,
+        tmp_dir=tmp_path,
+    )
+
+    cri = [
+        np.allclose(streamed, noisy_map, equal_nan=True),
+        np.isnan(streamed[3, 5]),
+        list(tmp_path.iterdir()) == [],
+    ]
+    assert all(cri)
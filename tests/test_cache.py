@@ -0,0 +1,97 @@
+import concurrent.futures
+import os
+
+import numpy as np
+
+from fargo_data_process.cache import FrameCache
+
+
+def write_frames(output_dir, nt=3):
+    with open(output_dir / "variables.par", "w") as f:
+        f.write("NX\t4\nNY\t2\n")
+    file_list = []
+    for i in range(nt):
+        file = str(output_dir / f"gasdens{i}.dat")
+        np.full((2, 4), float(i)).tofile(file)
+        file_list.append(file)
+    return file_list
+
+
+def test_FrameCache_load(tmp_path):
+    file_list = write_frames(tmp_path)
+    cache = FrameCache(str(tmp_path))
+    values = np.arange(24, dtype=float).reshape(3, 2, 4)
+
+    assert cache.load(file_list, float) is None
+    cache.store(file_list, values)
+    assert np.array_equal(cache.load(file_list, float), values)
+    assert cache.load(file_list, np.float32) is None
+    assert cache.load(file_list[:2], float) is None
+
+    # a rewritten output file invalidates the entry
+    np.full((2, 4), 9.0).tofile(file_list[1])
+    os.utime(file_list[1], ns=(0, 0))
+    assert cache.load(file_list, float) is None
+
+
+def test_FrameCache_evict(tmp_path):
+    file_list = write_frames(tmp_path)
+    values = np.zeros((1, 2, 4))
+    # room for two entries
+    cache = FrameCache(str(tmp_path), max_bytes=2 * (values.nbytes + 128))
+    for i in range(3):
+        cache.store(file_list[i : i + 1], values)
+        os.utime(cache._paths(file_list[i : i + 1], float)[0], (i, i))
+
+    cri = [
+        cache.load(file_list[0:1], float) is None,
+        cache.load(file_list[1:2], float) is not None,
+        cache.load(file_list[2:3], float) is not None,
+    ]
+    assert all(cri)
+
+
+def test_FrameCache_read_only(tmp_path, monkeypatch):
+    file_list = write_frames(tmp_path)
+    values = np.ones((3, 2, 4))
+    cache = FrameCache(str(tmp_path))
+    cache.store(file_list, values)
+
+    def read_only(*args, **kwargs):
+        raise PermissionError("read-only file system")
+
+    monkeypatch.setattr(os, "utime", read_only)
+    loaded = cache.load(file_list, float)
+    monkeypatch.setattr(os, "replace", read_only)
+    cache.store(file_list[:2], values[:2])
+    monkeypatch.setattr(os, "makedirs", read_only)
+    FrameCache(str(tmp_path), cache_dir=str(tmp_path / "missing")).store(
+        file_list, values
+    )
+
+    cri = [
+        np.array_equal(loaded, values),
+        cache.load(file_list[:2], float) is None,
+        sorted(os.listdir(cache.cache_dir))
+        == sorted(os.path.basename(file) for file in cache._paths(file_list, float)),
+    ]
+    assert all(cri)
+
+
+def test_FrameCache_concurrent_store(tmp_path):
+    file_list = write_frames(tmp_path)
+    values = np.arange(24, dtype=float).reshape(3, 2, 4)
+    caches = [FrameCache(str(tmp_path)) for _ in range(4)]
+    with concurrent.futures.ThreadPoolExecutor(4) as executor:
+        list(
+            executor.map(
+                lambda cache: [cache.store(file_list, values) for _ in range(20)],
+                caches,
+            )
+        )
+
+    cri = [
+        np.array_equal(caches[0].load(file_list, float), values),
+        not any(name.endswith(".tmp") for name in os.listdir(caches[0].cache_dir)),
+    ]
+    assert all(cri)
@@ -2,8 +2,21 @@ import os
 
 import numpy as np
 import pytest
+import skimage.transform
+import xarray as xr
 
-from fargo_data_process.fargoData import TimeSeqData, Coor, GridData, FrameData
+from fargo_data_process.cache import FrameCache
+from fargo_data_process.fargoData import (
+    TimeSeqData,
+    Coor,
+    GridData,
+    FrameData,
+    OutputDir,
+    scan_outputs,
+    INDEX_FILE,
+    CartesianToPolar,
+    PolarToCartesianMap,
+)
 
 
 @pytest.fixture
@@ -98,3 +111,407 @@ def test_to_cartesian(output_dir):
     tsdata = TimeSeqData(output_dir, "dens")
     value = tsdata.frames[0].to_cartesian(1000)
     assert 1
+
+
+def test_GridData_mmap(synthetic_output_dir):
+    file_path = os.path.join(synthetic_output_dir, "gasdens3.dat")
+    griddata = GridData(file_path, 8, 16)
+    griddata_mmap = GridData(file_path, 8, 16, mmap=True)
+
+    cri = [
+        isinstance(griddata_mmap.value, np.memmap),
+        not griddata_mmap.value.flags.writeable,
+        np.array_equal(griddata.value, griddata_mmap.value),
+    ]
+    assert all(cri)
+
+
+def test_TimeSeqData_lazy_xarray(synthetic_output_dir):
+    pytest.importorskip("dask")
+    tsdata = TimeSeqData(synthetic_output_dir, "dens")
+    lazy = tsdata.lazy_xarray(frames_per_chunk=2)
+
+    cri = [
+        lazy.chunks[0] == (2, 2, 1),
+        np.array_equal(lazy.values, tsdata.xarray.values),
+        np.array_equal(lazy.isel(t=-1).values, tsdata.xarray.isel(t=-1).values),
+    ]
+    assert all(cri)
+
+
+def test_TimeSeqData_max_workers(synthetic_output_dir):
+    serial = TimeSeqData(synthetic_output_dir, "vx")
+    threaded = TimeSeqData(synthetic_output_dir, "vx", max_workers=4)
+    assert threaded.xarray.equals(serial.xarray)
+
+
+def test_GridData_read_into(synthetic_output_dir):
+    file_path = os.path.join(synthetic_output_dir, "gasvy2.dat")
+    griddata = GridData(file_path, 8, 16)
+    out = np.empty((3, 8, 16))
+    griddata.read_into(out[1])
+    assert np.array_equal(out[1], griddata.value[..., 0])
+
+    with pytest.raises(ValueError):
+        GridData(file_path, 4, 16).read_into(np.empty((4, 16)))
+
+
+def test_TimeSeqData_selectors(synthetic_output_dir):
+    tsdata = TimeSeqData(synthetic_output_dir, "dens")
+    t = tsdata.t
+    cri = [
+        len(TimeSeqData(synthetic_output_dir, "dens", stride=2).file_list) == 3,
+        TimeSeqData(synthetic_output_dir, "dens", frame_indices=[4]).xarray.shape
+        == (1, 8, 16),
+        np.array_equal(
+            TimeSeqData(synthetic_output_dir, "dens", t_min=t[1], t_max=t[3]).t,
+            t[1:4],
+        ),
+    ]
+    assert all(cri)
+
+
+@pytest.mark.parametrize("batch_size", [1, 2, 5])
+def test_TimeSeqData_streaming_reducers(synthetic_output_dir, batch_size):
+    tsdata = TimeSeqData(synthetic_output_dir, "dens")
+    values = TimeSeqData(synthetic_output_dir, "dens").xarray.values
+    cri = [
+        tsdata.min_max(batch_size) == (np.min(values), np.max(values)),
+        np.allclose(tsdata.mean_over_x(batch_size), np.mean(values, axis=2)),
+        np.allclose(tsdata.var_over_t(batch_size), np.var(values, axis=0)),
+        "xarray" not in tsdata.__dict__,
+    ]
+    assert all(cri)
+
+
+def test_OutputDir(synthetic_output_dir):
+    output = OutputDir(synthetic_output_dir, max_workers=2)
+    arrays = output.read(["gasdens", "gasvx", "gasvy"])
+    dataset = output.dataset()
+    cri = [
+        output.fields == ["gasdens", "gasvx", "gasvy"],
+        arrays["gasvx"].identical(TimeSeqData(synthetic_output_dir, "vx").xarray),
+        output.time_seq_data("vy").xarray.identical(arrays["gasvy"]),
+        dataset["gasvy"].dims == ("t", "r_min", "theta"),
+    ]
+    assert all(cri)
+
+
+def test_TimeSeqData_float32(synthetic_output_dir):
+    # rewrite the dens frames in single precision, as written with the FLOAT opt
+    reference = TimeSeqData(synthetic_output_dir, "dens").xarray.values
+    for i, value in enumerate(reference):
+        value.astype(np.float32).tofile(
+            os.path.join(synthetic_output_dir, f"gasdens{i}.dat")
+        )
+
+    tsdata = TimeSeqData(synthetic_output_dir, "dens")
+    cri = [
+        tsdata.file_dtype == np.float32,
+        tsdata.xarray.dtype == np.float32,
+        np.allclose(tsdata.xarray.values, reference, rtol=1e-6),
+        TimeSeqData(synthetic_output_dir, "dens", dtype=float).xarray.dtype
+        == np.float64,
+    ]
+    assert all(cri)
+
+
+def test_TimeSeqData_cache(synthetic_output_dir):
+    reference = TimeSeqData(synthetic_output_dir, "vy").xarray
+    cache = FrameCache(synthetic_output_dir)
+    first = TimeSeqData(synthetic_output_dir, "vy", cache=cache).xarray
+    second = TimeSeqData(synthetic_output_dir, "vy", cache=cache)
+
+    cri = [
+        first.identical(reference),
+        isinstance(second.read_values(), np.memmap),
+        second.xarray.identical(reference),
+        np.array_equal(second.frames[2].value, reference.values[2][..., None]),
+    ]
+    assert all(cri)
+
+
+def test_TimeSeqData_cache_bounded_reads(synthetic_output_dir, monkeypatch):
+    import fargo_data_process.fargoData
+
+    read_frames = fargo_data_process.fargoData.read_frames
+    calls = []
+
+    def counting_read_frames(file_list, *args, **kwargs):
+        calls.append(len(file_list))
+        return read_frames(file_list, *args, **kwargs)
+
+    monkeypatch.setattr(
+        fargo_data_process.fargoData, "read_frames", counting_read_frames
+    )
+    cache = FrameCache(synthetic_output_dir)
+    tsdata = TimeSeqData(synthetic_output_dir, "dens", cache=cache)
+    t = tsdata.t
+    calls_t = list(calls)
+    blocks = [values for _, values in tsdata.iter_frames(1)]
+    calls_iter = list(calls)
+    lazy = TimeSeqData(synthetic_output_dir, "dens", cache=cache).lazy_xarray()
+    calls_lazy = list(calls)
+    last = lazy.isel(t=-1).values
+
+    cri = [
+        calls_t == [],
+        np.allclose(t, np.arange(5) * 2 * 0.0314159265359),
+        calls_iter == [1] * 5,
+        len(blocks) == 5,
+        calls_lazy == calls_iter,
+        calls == calls_iter + [1],
+        np.array_equal(last, blocks[-1][0]),
+    ]
+    assert all(cri)
+
+
+def test_TimeSeqData_negative_frame_indices(synthetic_output_dir, monkeypatch):
+    import fargo_data_process.fargoData
+    from fargo_data_process.config import get_config, make_output_dir
+
+    read_frames = fargo_data_process.fargoData.read_frames
+    calls = []
+
+    def counting_read_frames(file_list, *args, **kwargs):
+        calls.append([os.path.basename(f) for f in file_list])
+        return read_frames(file_list, *args, **kwargs)
+
+    monkeypatch.setattr(
+        fargo_data_process.fargoData, "read_frames", counting_read_frames
+    )
+    values = TimeSeqData(synthetic_output_dir, "dens").xarray.values
+    calls.clear()
+    config = get_config(["--output_dir", synthetic_output_dir, "--frame_indices", "-1"])
+    last = make_output_dir(**vars(config)).time_seq_data("dens").xarray
+    first_and_last = TimeSeqData(synthetic_output_dir, "dens", frame_indices=[0, -1])
+
+    cri = [
+        config.frame_indices == [-1],
+        calls == [["gasdens4.dat"]],
+        np.array_equal(last.values, values[-1:]),
+        [os.path.basename(f) for f in first_and_last.file_list]
+        == ["gasdens0.dat", "gasdens4.dat"],
+    ]
+    assert all(cri)
+
+
+def test_OutputDir_negative_frame_indices_mid_run(synthetic_output_dir):
+    # the simulation has written gasdens5.dat but not gasvx5.dat and gasvy5.dat yet
+    np.zeros((8, 16)).tofile(os.path.join(synthetic_output_dir, "gasdens5.dat"))
+    fields = ["gasdens", "gasvx", "gasvy"]
+    arrays = OutputDir(synthetic_output_dir, frame_indices=[-1]).read(fields)
+    output = OutputDir(synthetic_output_dir, frame_indices=[-2, -1])
+    bad = output.check_frames(fields, "fail")
+    tsdata = OutputDir(synthetic_output_dir, frame_indices=[-1]).time_seq_data("vx")
+
+    cri = [
+        all(
+            array.t.values.tolist() == [8 * 0.0314159265359]
+            for array in arrays.values()
+        ),
+        bad == [],
+        output.frame_indices == [3, 4],
+        [os.path.basename(f) for f in tsdata.file_list] == ["gasvx4.dat"],
+    ]
+    assert all(cri)
+
+
+def test_TimeSeqData_sample_points(synthetic_output_dir):
+    tsdata = TimeSeqData(synthetic_output_dir, "dens")
+    points = tsdata.sample_points(23, seed=0, stratified=True)
+    reference = tsdata.xarray.sel(
+        t=xr.DataArray(points[:, 2]),
+        r=xr.DataArray(points[:, 0]),
+        theta=xr.DataArray(points[:, 1]),
+    )
+    frame_counts = np.unique(points[:, 2], return_counts=True)[1]
+    batches = list(tsdata.iter_point_batches(4, n_batches=3, seed=1))
+
+    cri = [
+        points.shape == (23, 4),
+        np.array_equal(points[:, 3], reference.values),
+        np.array_equal(points, tsdata.sample_points(23, seed=0, stratified=True)),
+        set(frame_counts) == {4, 5},
+        len(batches) == 3,
+        all(batch.shape == (4, 4) for batch in batches),
+    ]
+    assert all(cri)
+
+
+def test_TimeSeqData_boundary_rows(synthetic_output_dir):
+    tsdata = TimeSeqData(synthetic_output_dir, "vy")
+    frame_rows = GridData(tsdata.file_list[1], 8, 16).read_rows(6, 8)
+    reference = TimeSeqData(synthetic_output_dir, "vy").flt_xyt_value.reshape(
+        (5, 8, 16, 4)
+    )
+
+    cri = [
+        np.array_equal(frame_rows, reference[1, 6:8, :, 3]),
+        "xarray" not in tsdata.__dict__,
+        np.array_equal(tsdata.flt_x_ymin_t_value, reference[:, 0].reshape((-1, 4))),
+        np.array_equal(tsdata.flt_x_ymax_t_value, reference[:, -1].reshape((-1, 4))),
+        np.array_equal(
+            tsdata.flt_x_yband_t_value(slice(2, 5)),
+            reference[:, 2:5].reshape((-1, 4)),
+        ),
+    ]
+    assert all(cri)
+
+
+def test_OutputDir_radial_profiles(synthetic_output_dir):
+    output = OutputDir(synthetic_output_dir, max_workers=2)
+    profiles = output.radial_profiles(
+        ["gasdens", "gasvy"], stats=("mean", "max"), percentiles=(90,), batch_size=2
+    )
+    sidecar = os.path.join(synthetic_output_dir, OutputDir.RADIAL_PROFILES)
+    mtime = os.stat(sidecar).st_mtime_ns
+    reused = OutputDir(synthetic_output_dir).radial_profiles(["gasvy"], ("mean",))
+    vy = output.dataarray("gasvy").values
+
+    cri = [
+        np.allclose(
+            profiles["gasdens_mean"].values,
+            TimeSeqData(synthetic_output_dir, "dens").mean_over_x(),
+        ),
+        np.array_equal(profiles["gasvy_max"].values, vy.max(axis=2)),
+        np.allclose(profiles["gasvy_p90"].values, np.percentile(vy, 90, axis=2)),
+        profiles["gasvy_mean"].dims == ("t", "r_min"),
+        os.stat(sidecar).st_mtime_ns == mtime,
+        reused["gasvy_mean"].identical(profiles["gasvy_mean"]),
+    ]
+    assert all(cri)
+
+
+def test_OutputDir_radial_profiles_mixed_selections(synthetic_output_dir):
+    dens = OutputDir(synthetic_output_dir).radial_profiles(["gasdens"])
+    vy = OutputDir(synthetic_output_dir, stride=2).radial_profiles(["gasvy"])
+    both = OutputDir(synthetic_output_dir, stride=2).radial_profiles(
+        ["gasdens", "gasvy"]
+    )
+    reused = OutputDir(synthetic_output_dir).radial_profiles(["gasdens"])
+    vy_values = OutputDir(synthetic_output_dir, stride=2).dataarray("gasvy").values
+
+    cri = [
+        len(dens.t) == 5,
+        len(vy.t) == 3,
+        not np.isnan(vy["gasvy_mean"].values).any(),
+        np.allclose(vy["gasvy_mean"].values, vy_values.mean(axis=2)),
+        len(both.t) == 3,
+        np.allclose(both["gasdens_mean"].values, dens["gasdens_mean"].values[::2]),
+        reused["gasdens_mean"].identical(dens["gasdens_mean"]),
+    ]
+    assert all(cri)
+
+
+def test_OutputDir_radial_profiles_mid_run(synthetic_output_dir):
+    # the simulation has written gasdens5.dat but not gasvx5.dat yet
+    np.full((8, 16), 5.0).tofile(os.path.join(synthetic_output_dir, "gasdens5.dat"))
+    fields = ["gasdens", "gasvx"]
+    profiles = OutputDir(synthetic_output_dir).radial_profiles(fields)
+    computed = OutputDir(synthetic_output_dir).compute_radial_profiles(fields)
+    dens = OutputDir(synthetic_output_dir).radial_profiles(["gasdens"])
+
+    cri = [
+        len(profiles.t) == 5,
+        not np.isnan(profiles["gasvx_mean"].values).any(),
+        profiles.equals(computed),
+        len(dens.t) == 6,
+        np.allclose(dens["gasdens_mean"].values[-1], 5.0),
+    ]
+    assert all(cri)
+
+
+def test_scan_outputs(synthetic_output_dir):
+    # a second fluid, a frame being written and files that are not outputs
+    np.zeros((8, 16)).tofile(os.path.join(synthetic_output_dir, "dust1dens0.dat"))
+    np.zeros(10).tofile(os.path.join(synthetic_output_dir, "gasdens5.dat"))
+    for name in ["planet0.dat", "monitor_gasdens.dat"]:
+        with open(os.path.join(synthetic_output_dir, name), "w") as f:
+            f.write("0")
+
+    records = scan_outputs(synthetic_output_dir)
+    reused = scan_outputs(synthetic_output_dir)
+    tsdata = TimeSeqData(synthetic_output_dir, "dens")
+
+    cri = [
+        len(records) == 17,
+        records["dust1dens0.dat"]["fluid"] == "dust1",
+        records["gasvy3.dat"]["frame_index"] == 3,
+        records["gasvy3.dat"]["time"] == tsdata.frames[3].time,
+        not records["gasdens5.dat"]["complete"],
+        records["gasdens4.dat"]["complete"],
+        os.path.exists(os.path.join(synthetic_output_dir, INDEX_FILE)),
+        reused == records,
+        [os.path.basename(file) for file in tsdata.file_list]
+        == [f"gasdens{i}.dat" for i in range(6)],
+        OutputDir(synthetic_output_dir).complete_frame_indices() == [0],
+    ]
+    assert all(cri)
+
+
+@pytest.mark.parametrize(
+    "on_bad_frame, frame_indices",
+    [("skip", [0, 1, 3, 4]), ("truncate", [0, 1])],
+)
+def test_OutputDir_check_frames(synthetic_output_dir, on_bad_frame, frame_indices):
+    # a frame that was cut short
+    np.zeros(10).tofile(os.path.join(synthetic_output_dir, "gasvx2.dat"))
+
+    with pytest.raises(ValueError):
+        OutputDir(synthetic_output_dir).check_frames()
+    output = OutputDir(synthetic_output_dir)
+    bad_frames = output.check_frames(on_bad_frame=on_bad_frame, checksum=True)
+
+    cri = [
+        bad_frames == [2],
+        output.frame_indices == frame_indices,
+        output.dataarray("gasvx").shape == (len(frame_indices), 8, 16),
+        "crc32" in output.manifest["gasvx1.dat"],
+        "crc32" not in output.manifest["gasvx2.dat"],
+    ]
+    assert all(cri)
+
+
+def test_OutputDir_check_frames_checksum(synthetic_output_dir):
+    fields = ["gasdens", "gasvx", "gasvy"]
+    recorded = OutputDir(synthetic_output_dir).check_frames(fields, checksum=True)
+    # bit rot: the same size and mtime, different values
+    file_path = os.path.join(synthetic_output_dir, "gasvy3.dat")
+    stat = os.stat(file_path)
+    np.zeros((8, 16)).tofile(file_path)
+    os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    unchecked = OutputDir(synthetic_output_dir).check_frames(fields)
+    output = OutputDir(synthetic_output_dir)
+    verified = output.check_frames(fields, "skip", checksum=True)
+    with pytest.raises(ValueError):
+        OutputDir(synthetic_output_dir).check_frames(fields, checksum=True)
+
+    cri = [
+        recorded == [],
+        unchecked == [],
+        verified == [3],
+        output.frame_indices == [0, 1, 2, 4],
+    ]
+    assert all(cri)
+
+
+def test_PolarToCartesianMap(synthetic_output_dir):
+    tsdata = TimeSeqData(synthetic_output_dir, "dens")
+    frame = tsdata.frames[2]
+    args = (40, 8, 16, frame.ymin, frame.ymax, frame.xmin, frame.xmax)
+    reference = skimage.transform.warp(
+        frame.value[..., 0], CartesianToPolar(*args), output_shape=(40, 40)
+    )
+    polar_to_cartesian = PolarToCartesianMap(*args)
+    images = polar_to_cartesian(tsdata.xarray.values, max_workers=2)
+
+    cri = [
+        np.allclose(polar_to_cartesian(frame.value[..., 0]), reference),
+        np.allclose(frame.to_cartesian(40), reference),
+        images.shape == (5, 40, 40),
+        np.allclose(images[2], reference),
+        tsdata.polar_to_cartesian_map(40) is tsdata.polar_to_cartesian_map(40),
+    ]
+    assert all(cri)
@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+import xarray as xr
+import yaml
+
+import fargo_data_process.fargo_collect_xarrays
+
+
+@pytest.fixture
+def runs_dir(tmp_path):
+    runs = ["aaa111", "bbb222", "ccc333"]
+    rng = np.random.default_rng(0)
+    r = np.linspace(0.4, 2.5, 16)
+    theta = np.linspace(-np.pi, np.pi, 8, endpoint=False)
+    for i, run in enumerate(runs):
+        outputs_dir = tmp_path / "runs" / f"{run}_job" / "fargo3d" / "outputs"
+        outputs_dir.mkdir(parents=True)
+        for phys_var_type in ["dens", "vy", "vx"]:
+            xr.DataArray(
+                rng.random((4, len(r), len(theta))),
+                coords={"t": np.arange(4.0), "r": r, "theta": theta},
+                dims=["t", "r", "theta"],
+                attrs={
+                    "phys_var_type": phys_var_type,
+                    "ALPHA": str(1e-3 * (i + 1)),
+                    "NX": str(len(theta)),
+                },
+            ).to_netcdf(outputs_dir / f"test_{phys_var_type}.nc")
+        (outputs_dir.parent / "arg_groups.yml").write_text("{}\n")
+    with open(tmp_path / "fargo_runs.yml", "w") as f:
+        yaml.safe_dump({"runs": runs, "parameters": ["ALPHA"]}, f)
+    return tmp_path
+
+
+@pytest.mark.parametrize(
+    "collecting_mode, workers, pool",
+    [
+        ("all", 1, "threads"),
+        ("all", 3, "threads"),
+        ("all", 2, "processes"),
+        ("last_t_frame", 1, "threads"),
+    ],
+)
+def test_main(runs_dir, collecting_mode, workers, pool):
+    save_dir = runs_dir / "collected"
+    save_dir.mkdir()
+    fargo_data_process.fargo_collect_xarrays.main(
+        runs_dir / "runs",
+        runs_dir / "fargo_runs.yml",
+        save_dir,
+        collecting_mode,
+        ymax=2.0,
+        dtype="float32",
+        workers=workers,
+        pool=pool,
+    )
+    collected = xr.load_dataarray(save_dir / "batch_truth_sigma.nc")
+    reference = [
+        xr.load_dataarray(
+            next(runs_dir.glob(f"runs/{run}*/fargo3d/outputs/test_dens.nc"))
+        )
+        for run in ["aaa111", "bbb222", "ccc333"]
+    ]
+    reference = np.stack(
+        [
+            array.isel(r=array.r < 2.0).values[
+                -1 if collecting_mode == "last_t_frame" else slice(None)
+            ]
+            for array in reference
+        ]
+    )
+    with open(save_dir / "fargo_setups.yml") as f:
+        fargo_setups = yaml.safe_load(f)
+
+    cri = [
+        collected.dims[0] == "run",
+        list(collected.run.values) == ["aaa111", "bbb222", "ccc333"],
+        np.allclose(collected.ALPHA.values, [1e-3, 2e-3, 3e-3]),
+        collected.dtype == np.float32,
+        np.allclose(collected.values, reference),
+        float(collected.r.max()) < 2.0,
+        fargo_setups == {"NX": "8", "YMAX": "2.0"},
+        (save_dir / "arg_groups.yml").exists(),
+    ]
+    assert all(cri)
+
+
+def test_discover_runs(runs_dir):
+    runs = ["aaa111", "ccc333"]
+    outputs_dir = fargo_data_process.fargo_collect_xarrays.discover_runs(
+        runs_dir / "runs", runs
+    )
+    (runs_dir / "runs" / "aaa111_copy" / "fargo3d" / "outputs").mkdir(parents=True)
+    (runs_dir / "runs" / "ccc333_job" / "fargo3d" / "outputs" / "test_vx.nc").unlink()
+
+    cri = [
+        outputs_dir
+        == {
+            run: runs_dir / "runs" / f"{run}_job" / "fargo3d" / "outputs"
+            for run in runs
+        },
+    ]
+    assert all(cri)
+    with pytest.raises(ValueError):
+        fargo_data_process.fargo_collect_xarrays.discover_runs(runs_dir / "runs", runs)
+    with pytest.raises(FileNotFoundError):
+        fargo_data_process.fargo_collect_xarrays.discover_runs(
+            runs_dir / "runs", ["ccc333"]
+        )
@@ -0,0 +1,21 @@
+import os
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import fargo_data_process.fargo_outputs2radial_plot
+
+
+def test_main(synthetic_output_dir):
+    config = fargo_data_process.fargo_outputs2radial_plot.get_config(
+        ["--output_dir", synthetic_output_dir, "--t_max", "0.2", "--stride", "2"]
+    )
+    fargo_data_process.fargo_outputs2radial_plot.main(**vars(config))
+
+    cri = [
+        os.path.exists(os.path.join(synthetic_output_dir, f"{v}-simulated-radial.png"))
+        for v in ["dens", "vx", "vy"]
+    ]
+    cri.append(os.path.exists(os.path.join(synthetic_output_dir, "radial_profiles.nc")))
+    assert all(cri)
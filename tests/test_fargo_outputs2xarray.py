@@ -0,0 +1,109 @@
+import os
+import pathlib
+
+import numpy as np
+import pytest
+import xarray as xr
+
+import fargo_data_process.fargo_outputs2xarray
+from fargo_data_process.fargoData import OutputDir, get_frame_time, get_setup
+
+
+def write_frame(output_dir, i, partial=False):
+    for field in ["gasdens", "gasvx", "gasvy"]:
+        values = np.full((8, 16), float(i))
+        if partial and field == "gasdens":
+            # the simulation is still writing this file
+            values = values[:3]
+        values.tofile(os.path.join(output_dir, f"{field}{i}.dat"))
+
+
+def test_append_new_frames(synthetic_output_dir):
+    save_dir = pathlib.Path(synthetic_output_dir)
+    setup = get_setup(synthetic_output_dir)
+    output = OutputDir(synthetic_output_dir)
+    n_first = fargo_data_process.fargo_outputs2xarray.append_new_frames(
+        output, save_dir
+    )
+    write_frame(synthetic_output_dir, 5)
+    write_frame(synthetic_output_dir, 6, partial=True)
+    n_second = fargo_data_process.fargo_outputs2xarray.append_new_frames(
+        output, save_dir
+    )
+    n_idle = fargo_data_process.fargo_outputs2xarray.append_new_frames(output, save_dir)
+    dens = xr.load_dataarray(save_dir / "test_dens.nc")
+
+    cri = [
+        n_first == 5,
+        n_second == 1,
+        n_idle == 0,
+        np.allclose(
+            dens.t.values,
+            [get_frame_time(f"gasdens{i}.dat", setup) for i in range(6)],
+        ),
+        np.array_equal(dens.values[5], np.full((8, 16), 5.0)),
+    ]
+    assert all(cri)
+
+
+def test_append_new_frames_after_main(synthetic_output_dir):
+    save_dir = pathlib.Path(synthetic_output_dir)
+    fargo_data_process.fargo_outputs2xarray.append_new_frames(
+        OutputDir(synthetic_output_dir), save_dir
+    )
+    # rewrites test_*.nc with a fixed t dimension
+    fargo_data_process.fargo_outputs2xarray.main(synthetic_output_dir)
+    manifest_removed = not (save_dir / "test_frames.yml").exists()
+    write_frame(synthetic_output_dir, 5)
+    n_appended = fargo_data_process.fargo_outputs2xarray.append_new_frames(
+        OutputDir(synthetic_output_dir), save_dir
+    )
+    vx = xr.load_dataarray(save_dir / "test_vx.nc")
+
+    cri = [
+        manifest_removed,
+        n_appended == 6,
+        len(vx.t) == 6,
+        np.array_equal(vx.values[5], np.full((8, 16), 5.0)),
+    ]
+    assert all(cri)
+
+
+def test_main_from_config(synthetic_output_dir):
+    save_dir = pathlib.Path(synthetic_output_dir)
+    config = fargo_data_process.fargo_outputs2xarray.get_config(
+        ["--output_dir", synthetic_output_dir, "--stride", "2", "--dtype", "float32"]
+    )
+    options = vars(config)
+    for key in ["follow", "poll_interval", "max_idle"]:
+        del options[key]
+    fargo_data_process.fargo_outputs2xarray.main(**options)
+    dens = xr.load_dataarray(save_dir / "test_dens.nc")
+
+    cri = [
+        len(dens.t) == 3,
+        dens.dtype == np.float32,
+        np.allclose(
+            dens.values[1],
+            np.fromfile(save_dir / "gasdens2.dat").reshape((8, 16)),
+        ),
+    ]
+    assert all(cri)
+
+
+def test_get_config_follow(synthetic_output_dir):
+    config = fargo_data_process.fargo_outputs2xarray.get_config(
+        ["--output_dir", synthetic_output_dir, "--follow", "1", "--max_idle", "0"]
+    )
+    cri = [config.follow == 1, config.max_idle == 0.0]
+    assert all(cri)
+    for option in [
+        ["--cache", "1"],
+        ["--checksum", "1"],
+        ["--on_bad_frame", "skip"],
+        ["--frame_indices", "-1"],
+    ]:
+        with pytest.raises(SystemExit):
+            fargo_data_process.fargo_outputs2xarray.get_config(
+                ["--follow", "1"] + option
+            )
@@ -0,0 +1,188 @@
+import astropy.convolution
+import numpy as np
+import pytest
+import xarray as xr
+
+import fargo_data_process.utils
+
+
+@pytest.fixture
+def polar_data():
+    rng = np.random.default_rng(0)
+    r = np.linspace(0.4, 2.5, 32)
+    theta = np.linspace(-np.pi, np.pi, 64, endpoint=False) + np.pi / 64
+    values = rng.random((3, len(r), len(theta)))
+    values[1, 10, 20] = np.nan
+    return xr.DataArray(
+        values,
+        coords={"run": ["a", "b", "c"], "r": r, "theta": theta},
+        dims=["run", "r", "theta"],
+    )
+
+
+def test_xarray_polar_to_cartesian(polar_data, tmp_path):
+    x = y = np.linspace(-2.5, 2.5, 50)
+    data_cart = fargo_data_process.utils.xarray_polar_to_cartesian(
+        polar_data, x, y, cache_dir=tmp_path
+    )
+    # the same interpolation with DataArray.interp
+    xgrid, ygrid = np.meshgrid(x, y, indexing="xy")
+    r = xr.DataArray(np.sqrt(xgrid**2 + ygrid**2), dims=["y", "x"])
+    theta = xr.DataArray(np.arctan2(ygrid, xgrid), dims=["y", "x"])
+    reference = polar_data.interp({"r": r, "theta": theta})
+    data_polar = fargo_data_process.utils.xarray_cartesian_to_polar(
+        data_cart, polar_data.r.values, polar_data.theta.values, cache_dir=tmp_path
+    )
+
+    cri = [
+        data_cart.dims == ("run", "y", "x"),
+        np.array_equal(np.isnan(data_cart.values), np.isnan(reference.values)),
+        np.allclose(data_cart.values, reference.values, equal_nan=True),
+        data_polar.dims == ("run", "r", "theta"),
+        len(list(tmp_path.glob("*.npz"))) == 2,
+    ]
+    assert all(cri)
+
+
+def test_InterpolationOperator_load(tmp_path):
+    grid0, grid1 = np.linspace(0, 1, 5), np.linspace(0, 2, 7)
+    points0, points1 = np.array([0.1, 0.5, 1.2]), np.array([0.3, 2.0, 1.0])
+    operator = fargo_data_process.utils.InterpolationOperator.from_grid(
+        grid0, grid1, points0, points1
+    )
+    operator.save(tmp_path / "operator.npz")
+    loaded = fargo_data_process.utils.InterpolationOperator.load(
+        tmp_path / "operator.npz"
+    )
+    values = np.add.outer(grid0, 2 * grid1)
+
+    cri = [
+        np.allclose(operator(values)[:2], points0[:2] + 2 * points1[:2]),
+        np.isnan(operator(values)[2]),
+        np.array_equal(loaded(values), operator(values), equal_nan=True),
+    ]
+    assert all(cri)
+
+
+def test_conservative_remap(polar_data):
+    x = y = np.linspace(-2.5, 2.5, 24)
+    values = polar_data.fillna(1.0)
+    data_cart = fargo_data_process.utils.xarray_polar_to_cartesian(
+        values, x, y, method="conservative"
+    )
+    ones_cart = fargo_data_process.utils.xarray_polar_to_cartesian(
+        xr.ones_like(values), x, y, method="conservative"
+    )
+    overlap = fargo_data_process.utils.polar_cartesian_overlap(
+        values.r.values, values.theta.values, x, y
+    )
+    covered = np.asarray(overlap.sum(axis=1)).reshape((len(y), len(x)))
+    r_edges = fargo_data_process.utils.cell_edges(values.r.values)
+    theta_edges = fargo_data_process.utils.cell_edges(values.theta.values)
+    cell_area = 0.5 * np.diff(r_edges**2)[:, None] * np.diff(theta_edges)[None]
+    data_polar = fargo_data_process.utils.xarray_cartesian_to_polar(
+        ones_cart, values.r.values, values.theta.values, method="conservative"
+    )
+
+    cri = [
+        np.allclose(covered.sum(), cell_area.sum()),
+        # the mass over the covered area is kept
+        np.allclose(
+            np.nansum(data_cart.values * covered, axis=(1, 2)),
+            (values.values * cell_area).sum(axis=(1, 2)),
+        ),
+        np.allclose(ones_cart.values[:, covered > 0], 1.0),
+        np.isnan(ones_cart.values[:, covered == 0]).all(),
+        np.allclose(data_polar.values, 1.0),
+    ]
+    assert all(cri)
+
+
+@pytest.mark.parametrize("staggered", [False, True])
+def test_rotate_dataarray_runs(polar_data, staggered):
+    data = polar_data.fillna(0.0)
+    if staggered:
+        # vx lives on the cell edges
+        data = data.assign_coords(theta=data.theta - np.pi / 64)
+    deltas = np.array([0.3, -np.pi, 2.0])
+    rotated = fargo_data_process.utils.rotate_dataarray_runs(data, deltas)
+    reference = [
+        fargo_data_process.utils.rotate_dataarray(data.isel(run=i), delta)
+        for i, delta in enumerate(deltas)
+    ]
+    # a band-limited signal is rotated exactly by the spectral method
+    signal = xr.ones_like(data) * np.cos(3 * data.theta)
+    spectral = fargo_data_process.utils.rotate_dataarray_runs(
+        signal, deltas, method="spectral"
+    )
+    exact = np.cos(3 * (data.theta.values - deltas[:, None, None]))
+
+    cri = [
+        rotated.dims == data.dims,
+        all(
+            np.allclose(rotated.isel(run=i).values, array.values)
+            for i, array in enumerate(reference)
+        ),
+        np.allclose(spectral.values, np.broadcast_to(exact, spectral.shape)),
+    ]
+    assert all(cri)
+
+
+def test_convolve_gaussian_beam():
+    rng = np.random.default_rng(0)
+    maps = rng.standard_normal((2, 3, 40, 50))
+    beam_sizes = np.array([[1.3, 5.0, 1.3], [20.0, 60.0, 5.0]])
+    convolved = fargo_data_process.utils.convolve_gaussian_beam(
+        maps, beam_sizes, batch_size=4
+    )
+    reference = [
+        astropy.convolution.convolve(
+            maps[i, j], astropy.convolution.Gaussian2DKernel(beam_sizes[i, j])
+        )
+        for i, j in np.ndindex(beam_sizes.shape)
+    ]
+
+    cri = [
+        convolved.shape == maps.shape,
+        np.allclose(convolved.reshape((-1, 40, 50)), np.stack(reference)),
+    ]
+    assert all(cri)
+
+
+@pytest.mark.parametrize("beam_size", [0.3, 1.3, 2.0, 5.25])
+def test_gaussian_kernel(beam_size):
+    kernel = fargo_data_process.utils.gaussian_kernel(beam_size)
+    reference = astropy.convolution.Gaussian2DKernel(beam_size).array
+
+    cri = [
+        kernel.shape == reference.shape,
+        np.allclose(kernel, reference / reference.sum()),
+    ]
+    assert all(cri)
+
+
+def test_run_seed_sequences():
+    runs = ["cdd269f6", "0a1b2c3d", "ffee0011"]
+    draws = {
+        run: np.random.default_rng(seed).random(4)
+        for run, seed in zip(runs, fargo_data_process.utils.run_seed_sequences(7, runs))
+    }
+    # the runs in another order, one at a time
+    reordered = {
+        run: np.random.default_rng(
+            fargo_data_process.utils.run_seed_sequence(7, run)
+        ).random(4)
+        for run in runs[::-1]
+    }
+
+    cri = [
+        all(np.array_equal(draws[run], reordered[run]) for run in runs),
+        not np.allclose(draws[runs[0]], draws[runs[1]]),
+        not np.allclose(
+            draws[runs[0]],
+            np.random.default_rng(
+                fargo_data_process.utils.run_seed_sequence(8, runs[0])
+            ).random(4),
+        ),
+    ]
+    assert all(cri)